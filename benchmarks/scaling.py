@@ -0,0 +1,234 @@
+"""Scaling microbenchmarks for the rating hot paths
+
+Times get_next_matchup, update_ratings, get_current_rankings and
+estimated_matchups for every rating system at growing collection sizes,
+and records peak memory. Every (system, size) case runs in its own
+process with a capped address space, so an engine that runs out of
+memory is reported as such instead of taking the whole run down. Run
+from the repository root:
+
+    python -m benchmarks.scaling --photos 100,1000,10000,100000,200000 --output scaling.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+REPORT_FORMAT = "photo-matchup-scaling"
+REPORT_VERSION = 1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentiles(samples_ns):
+    """Summarize call durations (nanoseconds) as microsecond percentiles"""
+    import numpy as np
+    if not samples_ns:
+        return None
+    us = np.array(samples_ns, dtype=np.float64) / 1000.0
+    return {
+        "calls": len(samples_ns),
+        "p50": float(np.percentile(us, 50)),
+        "p90": float(np.percentile(us, 90)),
+        "p99": float(np.percentile(us, 99)),
+        "max": float(us.max()),
+    }
+
+def run_case(system_name, n, calls, ranking_calls, warmup_taps, seed):
+    """Measure one engine at one size (runs inside the case's own process)"""
+    import random
+    import resource
+    import tracemalloc
+    sys.path.insert(0, ROOT)
+    from rating_systems.rating_factory import RatingFactory
+    
+    random.seed(seed)
+    judge = random.Random(seed)
+    photo_files = [f"photo_{i:07d}.jpg" for i in range(n)]
+    
+    def tap(engine):
+        """Play one comparison with a random answer; return False when finished"""
+        if engine.is_complete():
+            return False
+        photo1, photo2 = engine.get_next_matchup()
+        if photo1 is None:
+            return False
+        winner, loser = (photo1, photo2) if judge.random() < 0.5 else (photo2, photo1)
+        engine.update_ratings(winner, loser)
+        return True
+    
+    # Memory pass: construction, warm-up taps and one full ranking, traced
+    tracemalloc.start()
+    start = time.perf_counter_ns()
+    engine = RatingFactory.create_rating_system(system_name, photo_files)
+    init_ns = time.perf_counter_ns() - start
+    for _ in range(warmup_taps):
+        if not tap(engine):
+            break
+    engine.get_current_rankings()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    # Timing pass (untraced)
+    timings = {"get_next_matchup": [], "update_ratings": [], "get_current_rankings": [],
+               "get_top_rankings": [], "estimated_matchups": []}
+    for _ in range(calls):
+        if engine.is_complete():
+            break
+        start = time.perf_counter_ns()
+        photo1, photo2 = engine.get_next_matchup()
+        timings["get_next_matchup"].append(time.perf_counter_ns() - start)
+        if photo1 is None:
+            break
+        winner, loser = (photo1, photo2) if judge.random() < 0.5 else (photo2, photo1)
+        start = time.perf_counter_ns()
+        engine.update_ratings(winner, loser)
+        timings["update_ratings"].append(time.perf_counter_ns() - start)
+        
+        start = time.perf_counter_ns()
+        engine.estimated_matchups()
+        timings["estimated_matchups"].append(time.perf_counter_ns() - start)
+    
+    for _ in range(ranking_calls):
+        start = time.perf_counter_ns()
+        engine.get_current_rankings()
+        timings["get_current_rankings"].append(time.perf_counter_ns() - start)
+        
+        # Leaderboard-sized view
+        start = time.perf_counter_ns()
+        engine.get_top_rankings(10)
+        timings["get_top_rankings"].append(time.perf_counter_ns() - start)
+    
+    return {
+        "status": "ok",
+        "init_ms": init_ns / 1e6,
+        "tracemalloc_peak_bytes": peak_bytes,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "latency_us": {name: percentiles(samples) for name, samples in timings.items()},
+    }
+
+def case_main(args):
+    """Entry point of a case process: apply the memory cap, run, print one JSON line"""
+    try:
+        import resource
+        limit = args.memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # No address-space limits on this platform
+    
+    try:
+        result = run_case(args.case, args.case_photos, args.calls, args.ranking_calls,
+                          args.warmup_taps, args.seed)
+    except MemoryError:
+        result = {"status": "out_of_memory"}
+    except Exception as e:
+        result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    print(json.dumps(result))
+
+def spawn_case(system_name, n, args):
+    """Run one case in a child process and return its result dict"""
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--case", system_name, "--case-photos", str(n),
+        "--calls", str(args.calls), "--ranking-calls", str(args.ranking_calls),
+        "--warmup-taps", str(args.warmup_taps), "--seed", str(args.seed),
+        "--memory-limit-mb", str(args.memory_limit_mb),
+    ]
+    # One BLAS thread keeps the child's address space (and timings) predictable
+    env = dict(os.environ, OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1", MKL_NUM_THREADS="1")
+    
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, env=env, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        result = {"status": "timeout"}
+    else:
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode == 0 and lines:
+            result = json.loads(lines[-1])
+        else:
+            # Killed by the OS (e.g. the OOM killer) or crashed outright
+            result = {"status": "crashed", "returncode": completed.returncode,
+                      "error": completed.stderr.strip()[-500:]}
+    
+    result.update(system=system_name, photos=n, wall_seconds=time.perf_counter() - start)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-call latency and memory of every rating system as n grows")
+    parser.add_argument("--systems", help="Comma-separated rating systems (default: all)")
+    parser.add_argument("--photos", default="100,1000,10000,100000,200000", help="Comma-separated collection sizes")
+    parser.add_argument("--calls", type=int, default=500, help="Timed matchup/update calls per case")
+    parser.add_argument("--ranking-calls", type=int, default=3, help="Timed get_current_rankings calls per case")
+    parser.add_argument("--warmup-taps", type=int, default=1000, help="Taps played before timing")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--memory-limit-mb", type=int, default=2048, help="Address-space cap for each case")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a case is abandoned")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    # Internal: run a single case in this process
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--case-photos", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.case:
+        case_main(args)
+        return
+    
+    sys.path.insert(0, ROOT)
+    from rating_systems.rating_factory import RatingFactory
+    systems = RatingFactory.system_names
+    if args.systems:
+        systems = [name.strip() for name in args.systems.split(",") if name.strip()]
+        unknown = [name for name in systems if name not in RatingFactory.system_names]
+        if unknown:
+            parser.error(f"unknown rating systems: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.photos.split(",")]
+    
+    cases = []
+    for system_name in systems:
+        for n in sizes:
+            result = spawn_case(system_name, n, args)
+            cases.append(result)
+            
+            summary = result["status"]
+            if result["status"] == "ok":
+                latency = result["latency_us"]
+                parts = [f"{name} p50={latency[name]['p50']:.0f}us" for name in
+                         ("get_next_matchup", "update_ratings", "get_current_rankings") if latency[name]]
+                summary = "  ".join(parts) + f"  peak={result['tracemalloc_peak_bytes'] / 2**20:.1f}MB"
+            print(f"{system_name:>15}  n={n:<7} {summary}", file=sys.stderr)
+    
+    report = {
+        "format": REPORT_FORMAT,
+        "version": REPORT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "config": {
+            "systems": systems,
+            "photos": sizes,
+            "calls": args.calls,
+            "ranking_calls": args.ranking_calls,
+            "warmup_taps": args.warmup_taps,
+            "seed": args.seed,
+            "memory_limit_mb": args.memory_limit_mb,
+            "timeout": args.timeout,
+        },
+        "cases": cases,
+    }
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
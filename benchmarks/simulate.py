@@ -0,0 +1,197 @@
+"""Taps-to-accuracy simulation for every rating system
+
+Drives each engine headlessly against a synthetic judge that prefers
+photos by hidden latent scores, and records how well the engine's ranking
+matches the truth as taps accumulate. Run from the repository root:
+
+    python -m benchmarks.simulate --photos 100,400 --output report.json
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+# Allow running as a plain script as well as with -m
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rating_systems.rating_factory import RatingFactory
+from rating_systems.rank_metrics import kendall_tau, ranking_ids, top_k_precision
+
+REPORT_FORMAT = "photo-matchup-simulation"
+REPORT_VERSION = 1
+
+class LatentJudge:
+    """Synthetic judge: photo a beats photo b with probability sigmoid((s_a - s_b) / noise)
+    
+    With probability `inconsistency` the judge ignores the photos and
+    answers at random (a distracted or inconsistent judge).
+    """
+    
+    def __init__(self, n, noise=0.5, inconsistency=0.05, seed=0):
+        self.rng = random.Random(seed)
+        self.scores = np.random.default_rng(seed).normal(size=n)
+        self.noise = noise
+        self.inconsistency = inconsistency
+    
+    def prefers_first(self, a, b):
+        """Return True if the judge picks photo id a over photo id b"""
+        if self.rng.random() < self.inconsistency:
+            return self.rng.random() < 0.5
+        diff = float(self.scores[a] - self.scores[b])
+        if self.noise <= 0:
+            return diff > 0
+        return self.rng.random() < 1.0 / (1.0 + math.exp(-diff / self.noise))
+
+def simulate(system_name, n, judge, seed, max_taps, checkpoints, k, confidence=0.8):
+    """Run one engine until it finishes or max_taps, returning a result dict"""
+    random.seed(seed)
+    photo_files = [f"photo_{i:06d}.jpg" for i in range(n)]
+    engine = RatingFactory.create_rating_system(system_name, photo_files, top_k=k, confidence=confidence)
+    photo_to_index = engine.photo_to_index
+    
+    curve = []
+    def record(taps):
+        order = ranking_ids(engine.get_current_rankings(), photo_to_index)
+        curve.append({
+            "taps": taps,
+            "taps_per_photo": taps / n,
+            "kendall_tau": kendall_tau(order, judge.scores),
+            "top_k_precision": top_k_precision(order, judge.scores, k),
+        })
+    
+    # CPU time of the engine only (the judge and the metrics are excluded)
+    select_seconds = 0.0
+    update_seconds = 0.0
+    taps = 0
+    checkpoints = sorted(set(checkpoints))
+    next_checkpoint = 0
+    
+    while taps < max_taps and not engine.is_complete():
+        start = time.process_time()
+        photo1, photo2 = engine.get_next_matchup()
+        select_seconds += time.process_time() - start
+        if photo1 is None:
+            break
+        
+        a, b = photo_to_index[photo1], photo_to_index[photo2]
+        winner, loser = (photo1, photo2) if judge.prefers_first(a, b) else (photo2, photo1)
+        
+        start = time.process_time()
+        engine.update_ratings(winner, loser)
+        update_seconds += time.process_time() - start
+        taps += 1
+        
+        while next_checkpoint < len(checkpoints) and checkpoints[next_checkpoint] <= taps:
+            if checkpoints[next_checkpoint] == taps:
+                record(taps)
+            next_checkpoint += 1
+    
+    if not curve or curve[-1]["taps"] != taps:
+        record(taps)
+    
+    final = curve[-1]
+    return {
+        "system": system_name,
+        "photos": n,
+        "seed": seed,
+        "taps": taps,
+        "complete": engine.is_complete(),
+        "estimated_matchups": engine.estimated_matchups(),
+        "final_kendall_tau": final["kendall_tau"],
+        "final_top_k_precision": final["top_k_precision"],
+        "taps_to_tau": {
+            str(target): next((point["taps"] for point in curve if point["kendall_tau"] >= target), None)
+            for target in (0.8, 0.9, 0.95)
+        },
+        "cpu_us_per_tap": {
+            "select": 1e6 * select_seconds / max(taps, 1),
+            "update": 1e6 * update_seconds / max(taps, 1),
+            "total": 1e6 * (select_seconds + update_seconds) / max(taps, 1),
+        },
+        "curve": curve,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate every rating system against a latent-score judge")
+    parser.add_argument("--systems", default=",".join(RatingFactory.system_names),
+                        help="Comma-separated rating systems (default: all)")
+    parser.add_argument("--photos", default="100,400", help="Comma-separated collection sizes")
+    parser.add_argument("--noise", type=float, default=0.5,
+                        help="Logistic noise scale of the judge (latent scores have unit variance)")
+    parser.add_argument("--inconsistency", type=float, default=0.05,
+                        help="Probability that a tap is answered at random")
+    parser.add_argument("--top-k", type=int, default=10, help="K for top-K precision and the Top-K system")
+    parser.add_argument("--confidence", type=float, default=0.8,
+                        help="Stopping confidence of Bradley-Terry, Glicko-2 and TrueSkill")
+    parser.add_argument("--seed", type=int, default=1, help="Base seed (runs use seed, seed+1, ...)")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per system and size")
+    parser.add_argument("--max-taps-per-photo", type=float, default=30,
+                        help="Stop an engine after this many taps per photo")
+    parser.add_argument("--checkpoints", default="0.5,1,2,3,4,6,8,10,15,20,30",
+                        help="Taps per photo at which accuracy is measured")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    
+    systems = [name.strip() for name in args.systems.split(",") if name.strip()]
+    unknown = [name for name in systems if name not in RatingFactory.system_names]
+    if unknown:
+        parser.error(f"unknown rating systems: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.photos.split(",")]
+    per_photo = [float(x) for x in args.checkpoints.split(",")]
+    
+    runs = []
+    for n in sizes:
+        checkpoints = [max(1, int(round(x * n))) for x in per_photo]
+        max_taps = int(args.max_taps_per_photo * n)
+        for repeat in range(args.repeats):
+            seed = args.seed + repeat
+            for system_name in systems:
+                # Same judge (scores and answer stream) for every system
+                judge = LatentJudge(n, args.noise, args.inconsistency, seed)
+                result = simulate(system_name, n, judge, seed, max_taps, checkpoints, args.top_k,
+                                  args.confidence)
+                runs.append(result)
+                print(f"{system_name:>15}  n={n:<6} seed={seed:<4} taps={result['taps']:<8} "
+                      f"tau={result['final_kendall_tau']:.3f}  top{args.top_k}={result['final_top_k_precision']:.2f}  "
+                      f"{result['cpu_us_per_tap']['total']:.0f} us/tap", file=sys.stderr)
+    
+    report = {
+        "format": REPORT_FORMAT,
+        "version": REPORT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "config": {
+            "systems": systems,
+            "photos": sizes,
+            "noise": args.noise,
+            "inconsistency": args.inconsistency,
+            "top_k": args.top_k,
+            "confidence": args.confidence,
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "max_taps_per_photo": args.max_taps_per_photo,
+            "checkpoints_per_photo": per_photo,
+        },
+        "runs": runs,
+    }
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 import os
+import random
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QPushButton, QLabel, QComboBox, 
-                            QSpacerItem, QSizePolicy, QFileDialog, QTextEdit)
+                            QPushButton, QLabel, QComboBox, QSpinBox,
+                            QSpacerItem, QSizePolicy, QFileDialog, QTextEdit,
+                            QMessageBox)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+from gui.image_cache import image_cache
 from gui.matchup_screen import MatchupScreen
 from rating_systems.rating_factory import RatingFactory
 from utils.config import load_config, save_config
+from utils.session_journal import SessionJournal, journal_path, read_journal, snapshot_path
 
 class HomeScreen(QMainWindow):
     def __init__(self, input_dir=None, output_dir=None):
@@ -21,6 +25,7 @@ class HomeScreen(QMainWindow):
         
         # Load configuration
         self.config = load_config()
+        image_cache.set_budget(int(self.config["image_cache_mb"] * 1024 * 1024))
         
         # Central widget and layout
         central_widget = QWidget()
@@ -82,33 +87,9 @@ class HomeScreen(QMainWindow):
         self.rating_combo = QComboBox()
         self.rating_combo.setStyleSheet("QComboBox { min-height: 40px; }")  # Larger for touch
         
-        # Add rating systems with detailed explanations
-        self.rating_systems = {
-            "Quick Sort": {
-                "short": "Quick and efficient sorting algorithm",
-                "long": "Quick Sort is a divide-and-conquer algorithm that works by partitioning an array into two sub-arrays, then sorting the sub-arrays recursively. For images, this means fewer comparisons (n log n) than other methods. Real-world uses include sorting large datasets in database systems, programming language implementations, and in various computer science applications."
-            },
-            "Simple": {
-                "short": "Basic win/loss counting system",
-                "long": "The Simple rating system counts wins and losses for each item. It's straightforward to implement and understand but requires comparing all possible pairs (n²/2 comparisons). In the real world, it's used in basic sports rankings, informal competitions, and situations where simplicity is valued over statistical precision."
-            }, 
-            "Elo": {
-                "short": "Chess rating system adapted for photos",
-                "long": "The Elo rating system, originally developed for chess rankings, calculates the relative skill levels between competitors. When comparing photos, higher-rated photos are expected to win against lower-rated ones. The system adjusts ratings based on actual outcomes vs. expected outcomes. Used in chess, sports leagues, video games (like League of Legends), and matchmaking systems worldwide."
-            },
-            "Bradley-Terry": {
-                "short": "Statistical model for paired comparisons",
-                "long": "The Bradley-Terry model is a probability model that predicts the outcome of paired comparisons. It assumes the probability of item A being chosen over item B is related to their underlying 'strength' parameters. Real-world applications include preference testing in market research, sports analytics, ranking systems in academia, and various choice modeling scenarios in psychology."
-            },
-            "Glicko-2": {
-                "short": "Enhanced Elo with rating deviation",
-                "long": "Glicko-2 extends the Elo system by tracking both a rating and a 'rating deviation' (uncertainty) for each item. This allows the system to be more cautious with items that have few comparisons. Used in online gaming platforms (such as Chess.com), competitive gaming leagues, and sports rating systems where the reliability of a rating is important."
-            },
-            "TrueSkill": {
-                "short": "Microsoft's skill rating system",
-                "long": "TrueSkill was developed by Microsoft Research for Xbox Live to match players in competitive games. It uses Bayesian inference to track both skill level and uncertainty. TrueSkill allows for team-based and multiplayer rankings, and converges quickly with fewer comparisons. Used in Xbox Live matchmaking, Halo tournaments, and other gaming platforms to create balanced matches between players."
-            }
-        }
+        # Add rating systems with detailed explanations (registry metadata
+        # only; an engine is imported when a session starts)
+        self.rating_systems = {name: RatingFactory.system_info(name) for name in RatingFactory.system_names}
         
         for system in self.rating_systems:
             self.rating_combo.addItem(system)
@@ -122,6 +103,20 @@ class HomeScreen(QMainWindow):
         main_layout.addLayout(rating_layout)
         main_layout.addSpacing(10)
         
+        # Number of photos to find (only shown for Top-K)
+        self.top_k_widget = QWidget()
+        top_k_layout = QHBoxLayout(self.top_k_widget)
+        top_k_layout.setContentsMargins(0, 0, 0, 0)
+        top_k_label = QLabel("Photos to find (K):")
+        self.top_k_spin = QSpinBox()
+        self.top_k_spin.setRange(1, 1000)
+        self.top_k_spin.setValue(20)
+        self.top_k_spin.setMinimumHeight(40)  # Larger for touch
+        top_k_layout.addWidget(top_k_label)
+        top_k_layout.addWidget(self.top_k_spin, 1)  # 1 gives it stretch
+        self.top_k_widget.setVisible(False)
+        main_layout.addWidget(self.top_k_widget)
+        
         # Rating system description (short version)
         self.rating_description = QLabel(self.rating_systems["Quick Sort"]["short"])
         self.rating_description.setStyleSheet("color: #aaaaaa;")
@@ -165,6 +160,9 @@ class HomeScreen(QMainWindow):
         # Initialize variables
         self.folder_path = None
         self.photo_files = []
+        
+        # Connect after everything update_matchup_info uses exists
+        self.top_k_spin.valueChanged.connect(self.update_matchup_info)
     
     def toggle_fullscreen(self):
         """Toggle between fullscreen and windowed mode"""
@@ -205,53 +203,125 @@ class HomeScreen(QMainWindow):
         
         # Update matchup info
         self.update_matchup_info()
+        
+        # Offer to continue a session that was interrupted in this folder
+        self.offer_resume()
+    
+    def offer_resume(self):
+        """Ask whether to resume the session recorded in the folder's journal"""
+        contents = read_journal(journal_path(self.folder_path))
+        if contents is None or not len(contents["records"]):
+            return
+        
+        # Only resume if the engine is known and every journaled photo is still there
+        system_name = contents["system_name"]
+        available = {os.path.basename(p) for p in self.photo_files}
+        if system_name not in self.rating_systems or not all(
+                name in available for name in contents["photo_names"]):
+            return
+        
+        reply = QMessageBox.question(
+            self, "Resume Session",
+            f"An unfinished {system_name} session with {len(contents['records'])} "
+            f"comparisons was found in this folder.\n\nResume it?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply == QMessageBox.Yes:
+            self.resume_session(contents)
+    
+    def resume_session(self, contents):
+        """Rebuild the journaled session and continue where it stopped"""
+        self.photo_files = [os.path.join(self.folder_path, name) for name in contents["photo_names"]]
+        self.rating_combo.setCurrentText(contents["system_name"])
+        self.top_k_spin.setValue(contents["top_k"])
+        
+        # Same seed -> same initial shuffle, so the replayed results line up
+        # with the comparisons the engine asks for
+        random.seed(contents["seed"])
+        rating_system = RatingFactory.create_rating_system(
+            contents["system_name"], self.photo_files, top_k=contents["top_k"],
+            confidence=self.config["stop_confidence"]
+        )
+        records = contents["records"]
+        
+        # Start from the session's latest snapshot if there is one, so only
+        # the results journaled after it need replaying
+        from rating_systems.snapshot import snapshot_metadata
+        
+        start = 0
+        snapshot = snapshot_path(self.folder_path)
+        metadata = snapshot_metadata(snapshot)
+        if (metadata and metadata.get("seed") == contents["seed"]
+                and metadata.get("journal_records", 0) <= len(records)):
+            try:
+                rating_system.restore(snapshot)
+                start = metadata["journal_records"]
+            except (OSError, ValueError) as e:
+                print(f"Error restoring session snapshot: {e}")
+        rating_system.update_many(records[start:, 0], records[start:, 1])
+        
+        try:
+            journal = SessionJournal.resume(journal_path(self.folder_path), contents)
+        except OSError as e:
+            print(f"Error reopening session journal: {e}")
+            journal = None
+        
+        self.launch_matchups(rating_system, journal)
     
     def update_matchup_info(self):
+        selected_system = self.rating_combo.currentText()
+        self.top_k_widget.setVisible("top_k" in self.rating_systems[selected_system]["options"])
+        
         if not self.photo_files:
-            selected_system = self.rating_combo.currentText()
             self.rating_description.setText(self.rating_systems[selected_system]["short"])
             self.rating_explanation.setText(self.rating_systems[selected_system]["long"])
             self.matchup_info.setText("Estimated matchups: 0")
             return
         
-        # Get estimated matchups based on selected algorithm
-        selected_system = self.rating_combo.currentText()
+        # Get estimated matchups from the selected system's cost model
         num_photos = len(self.photo_files)
         self.rating_description.setText(self.rating_systems[selected_system]["short"])
         self.rating_explanation.setText(self.rating_systems[selected_system]["long"])
+        est_matchups = RatingFactory.estimated_matchups(selected_system, num_photos, self.top_k_spin.value())
         
-        if selected_system == "Quick Sort":
-            # Quick Sort is approximately n log n comparisons
-            est_matchups = int(num_photos * (num_photos.bit_length() - 1))
-        elif selected_system == "Simple":
-            # Simple system needs n(n-1)/2 comparisons (all pairs)
-            est_matchups = num_photos * (num_photos - 1) // 2
-        elif selected_system in ["Elo", "Glicko-2", "TrueSkill"]:
-            # These need fewer comparisons, roughly 5-7 per photo
-            est_matchups = num_photos * 6
-        elif selected_system == "Bradley-Terry":
-            # Bradley-Terry typically needs more data, ~10 comparisons per photo
-            est_matchups = num_photos * 10
+        if self.rating_systems[selected_system]["adaptive"]:
+            # These stop once the ranking settles, so the count is only a first guess
+            self.matchup_info.setText(f"Estimated matchups: ~{est_matchups}")
         else:
-            est_matchups = num_photos * num_photos.bit_length()
-        
-        self.matchup_info.setText(f"Estimated matchups: {est_matchups}")
+            self.matchup_info.setText(f"Estimated matchups: {est_matchups}")
     
     def start_matchups(self):
         if not self.photo_files or len(self.photo_files) < 2:
             return
         
-        # Create output directory if it doesn't exist
-        os.makedirs(self.output_dir, exist_ok=True)
-        
-        # Create rating system
+        # Create rating system from a recorded seed, so the session can be
+        # rebuilt exactly from its journal
         selected_system = self.rating_combo.currentText()
+        seed = random.getrandbits(64)
+        random.seed(seed)
         rating_system = RatingFactory.create_rating_system(
-            selected_system, self.photo_files
+            selected_system, self.photo_files, top_k=self.top_k_spin.value(),
+            confidence=self.config["stop_confidence"]
         )
         
+        # Journal every result, so a power cut doesn't lose the session
+        try:
+            journal = SessionJournal.create(
+                journal_path(self.folder_path), selected_system, seed,
+                [os.path.basename(p) for p in self.photo_files], top_k=self.top_k_spin.value()
+            )
+        except OSError as e:
+            print(f"Error creating session journal: {e}")
+            journal = None
+        
+        self.launch_matchups(rating_system, journal)
+    
+    def launch_matchups(self, rating_system, journal=None):
+        """Open the matchup screen for a rating system"""
+        # Create output directory if it doesn't exist
+        os.makedirs(self.output_dir, exist_ok=True)
+        
         # Launch matchup screen in the same mode (fullscreen or windowed)
-        self.matchup_screen = MatchupScreen(self.photo_files, rating_system, self.output_dir)
+        self.matchup_screen = MatchupScreen(self.photo_files, rating_system, self.output_dir, journal)
         if self.isFullScreen:
             self.matchup_screen.showFullScreen()
         else:
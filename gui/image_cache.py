@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import os
+import threading
+
+# Default memory budget for decoded photos. A matchup photo (600x600 RGB)
+# takes about 1 MB, so this holds a few dozen of them, which is safe on a
+# Raspberry Pi with 1 GB of RAM
+DEFAULT_BUDGET_MB = 64
+
+class ImageCache:
+    """LRU cache of decoded QImages, kept within a memory budget in bytes
+    
+    Entries are keyed by (path, modification time, target size), so an
+    edited photo is decoded again and the same photo can be cached at
+    matchup and thumbnail sizes side by side. The least recently used
+    entries are evicted once the budget is exceeded. Worker threads of the
+    image loader use the cache too, so every access holds a lock.
+    """
+    
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()  # key -> QImage, least recently used first
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def key(self, photo_path, max_size):
+        """Return the cache key of photo_path decoded to fit max_size (raises OSError if unreadable)"""
+        return photo_path, os.stat(photo_path).st_mtime_ns, tuple(max_size)
+    
+    def get(self, key, count_miss=True):
+        """Return the cached QImage for key, or None, counting a hit or a miss
+        
+        Pass count_miss=False for a quick look ahead of a lookup that will
+        count the miss itself.
+        """
+        with self.lock:
+            image = self.entries.get(key)
+            if image is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return image
+    
+    def put(self, key, image):
+        """Add a decoded QImage, evicting least recently used entries to stay in budget"""
+        size = image.sizeInBytes()
+        if size > self.budget_bytes:
+            return  # Would evict everything else and still not fit
+        
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old.sizeInBytes()
+            self.entries[key] = image
+            self.size_bytes += size
+            self._evict()
+    
+    def set_budget(self, budget_bytes):
+        """Change the memory budget, evicting entries that no longer fit"""
+        with self.lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+    
+    def _evict(self):
+        """Drop least recently used entries until within budget (lock held)"""
+        while self.size_bytes > self.budget_bytes and self.entries:
+            _, image = self.entries.popitem(last=False)
+            self.size_bytes -= image.sizeInBytes()
+            self.evictions += 1
+    
+    def clear(self):
+        """Drop every entry (the counters are kept)"""
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+    
+    def stats(self):
+        """Return the counters and current usage as a dict"""
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "size_bytes": self.size_bytes,
+                "budget_bytes": self.budget_bytes,
+            }
+
+# Shared by every widget that shows photos
+image_cache = ImageCache()
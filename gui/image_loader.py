@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage
+from PIL import Image
+from PIL.ImageOps import exif_transpose
+import traceback
+
+from gui.image_cache import image_cache
+
+# Largest size photos are decoded to for the matchup screen (Raspberry Pi friendly)
+DISPLAY_SIZE = (600, 600)
+
+# EXIF orientation tag, and its values that turn the photo a quarter turn
+EXIF_ORIENTATION = 0x0112
+QUARTER_TURNS = (5, 6, 7, 8)
+
+# Formats whose decoder can scale down while decoding (MPO is the multi-picture
+# JPEG some cameras and phones write)
+DRAFT_FORMATS = ("JPEG", "MPO")
+
+def decode_image(photo_path, max_size=DISPLAY_SIZE):
+    """Open a photo, fix its rotation and shrink it to fit max_size, returning a QImage
+    
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale when that still
+    covers max_size, which is several times faster than a full decode and
+    needs a fraction of the memory. Other formats are decoded in full.
+    Only QImage is used (not QPixmap), so this is safe to call from worker threads.
+    """
+    pil_image = Image.open(photo_path)
+    
+    if pil_image.format in DRAFT_FORMATS:
+        # The decoder picks the smallest scale still at least this size. The
+        # size is asked for before rotation, so swap it for turned photos
+        width, height = max_size
+        if pil_image.getexif().get(EXIF_ORIENTATION) in QUARTER_TURNS:
+            width, height = height, width
+        pil_image.draft(pil_image.mode, (width, height))
+    
+    # Fix rotation using exif_transpose
+    pil_image = exif_transpose(pil_image)
+    
+    if pil_image.width > max_size[0] or pil_image.height > max_size[1]:
+        pil_image.thumbnail(max_size, Image.LANCZOS)
+    
+    # Convert PIL image to QImage
+    if pil_image.mode == "RGBA":
+        data = pil_image.tobytes("raw", "RGBA")
+        qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 4, QImage.Format_RGBA8888)
+    else:
+        # Convert to RGB for other modes
+        if pil_image.mode != "RGB":
+            pil_image = pil_image.convert("RGB")
+        data = pil_image.tobytes("raw", "RGB")
+        qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 3, QImage.Format_RGB888)
+    
+    # The QImage only borrows data, so give it its own copy before data goes away
+    return qimage.copy()
+
+def load_image(photo_path, max_size=DISPLAY_SIZE):
+    """Return photo_path decoded to fit max_size, from the shared image cache when possible"""
+    key = image_cache.key(photo_path, max_size)
+    image = image_cache.get(key)
+    if image is None:
+        image = decode_image(photo_path, max_size)
+        image_cache.put(key, image)
+    return image
+
+def cached_image(photo_path, max_size=DISPLAY_SIZE):
+    """Return photo_path decoded to fit max_size if it is in the image cache, else None"""
+    try:
+        return image_cache.get(image_cache.key(photo_path, max_size), count_miss=False)
+    except OSError:
+        return None  # Unreadable: left to the decode to report
+
+class ImageLoader(QObject):
+    """Decodes photos into QImages on a small worker pool, ahead of when they are shown
+    
+    Decoded photos go through the shared image cache, so a photo that was
+    shown recently is not decoded again.
+    
+    prefetch() names the photos expected next; decoding those starts in the
+    background and any earlier job not among them is cancelled (or, if it
+    is already running, its result is dropped). request() asks for a photo
+    that is needed now: loaded(photo_path, image) is emitted on the GUI
+    thread once it is decoded, with a null QImage if decoding failed.
+    """
+    loaded = pyqtSignal(str, QImage)
+    
+    # Internal: a job finished (emitted from the worker thread, delivered on the GUI thread)
+    job_done = pyqtSignal(str)
+    
+    def __init__(self, max_size=DISPLAY_SIZE, workers=2, parent=None):
+        super().__init__(parent)
+        self.max_size = tuple(max_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-loader")
+        
+        # photo path -> Future of its QImage; only touched on the GUI thread
+        self.jobs = {}
+        
+        # Photos whose loaded signal is waited for
+        self.requested = set()
+        
+        # Set by shutdown(): jobs still running then must not signal a deleted loader
+        self.closed = False
+        
+        self.job_done.connect(self.finish_job)
+    
+    def set_max_size(self, max_size):
+        """Decode to fit max_size from now on
+        
+        Jobs at the old size are dropped, and photos still requested are
+        decoded again at the new size, so loaded always delivers max_size.
+        """
+        max_size = tuple(max_size)
+        if max_size == self.max_size:
+            return
+        self.max_size = max_size
+        
+        for future in self.jobs.values():
+            future.cancel()
+        self.jobs.clear()
+        for photo_path in self.requested:
+            self.submit(photo_path)
+    
+    def prefetch(self, photo_paths):
+        """Start decoding photo_paths and cancel jobs for every other photo not requested"""
+        wanted = set(photo_paths) | self.requested
+        for photo_path in list(self.jobs):
+            if photo_path not in wanted:
+                self.jobs.pop(photo_path).cancel()
+        
+        for photo_path in photo_paths:
+            self.submit(photo_path)
+    
+    def release_requests(self):
+        """Stop waiting for the photos requested so far (their matchup was replaced)
+        
+        Their jobs become ordinary prefetches, so the next prefetch() cancels
+        them unless it names them again.
+        """
+        self.requested.clear()
+    
+    def request(self, photo_path):
+        """Return the decoded QImage of photo_path if it is ready, else None and emit loaded later"""
+        image = self.take(photo_path)
+        if image is not None:
+            return image
+        
+        # Shown recently: no need to wait for a worker
+        if photo_path not in self.jobs:
+            image = cached_image(photo_path, self.max_size)
+            if image is not None:
+                return image
+        
+        self.requested.add(photo_path)
+        self.submit(photo_path)
+        return None
+    
+    def take(self, photo_path):
+        """Return the decoded QImage of photo_path if its job has finished (a null one on error)"""
+        future = self.jobs.get(photo_path)
+        if future is None or not future.done() or future.cancelled():
+            return None
+        
+        del self.jobs[photo_path]
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error loading image {photo_path}: {str(e)}")
+            traceback.print_exception(type(e), e, e.__traceback__)
+            return QImage()
+    
+    def submit(self, photo_path):
+        """Queue a decode of photo_path unless one is already queued or done"""
+        if photo_path in self.jobs:
+            return
+        future = self.executor.submit(load_image, photo_path, self.max_size)
+        self.jobs[photo_path] = future
+        future.add_done_callback(lambda _, photo_path=photo_path: self.closed or self.job_done.emit(photo_path))
+    
+    def finish_job(self, photo_path):
+        """Hand a finished job to whoever requested it"""
+        if photo_path not in self.requested:
+            return  # Prefetched: kept until taken, or dropped as stale
+        
+        image = self.take(photo_path)
+        if image is None:
+            return  # Callback of a cancelled job; a newer one is on its way
+        self.requested.discard(photo_path)
+        self.loaded.emit(photo_path, image)
+    
+    def shutdown(self):
+        """Cancel every pending job and stop the workers"""
+        self.closed = True
+        self.requested.clear()
+        for future in self.jobs.values():
+            future.cancel()
+        self.jobs.clear()
+        self.executor.shutdown(wait=False)
@@ -1,12 +1,12 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                           QScrollArea, QWidget, QPushButton)
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QPixmap, QImage
-from PIL import Image, ImageQt
-from PIL.ImageOps import exif_transpose
+from PyQt5.QtGui import QFont, QPixmap
 import os
 import traceback
 
+from gui.image_loader import load_image
+
 class LeaderboardDialog(QDialog):
     def __init__(self, rankings, parent=None):
         super().__init__(parent)
@@ -45,26 +45,9 @@ class LeaderboardDialog(QDialog):
             
             # Thumbnail
             try:
-                # Try with PIL to handle all formats and rotations
-                pil_image = Image.open(photo_path)
-                pil_image = exif_transpose(pil_image)
-                
-                # Create thumbnail
-                pil_image.thumbnail((120, 120))  # Larger thumbnail for touch screen
-                
-                # Convert PIL image to QImage then to QPixmap
-                if pil_image.mode == "RGB":
-                    data = pil_image.tobytes("raw", "RGB")
-                    qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 3, QImage.Format_RGB888)
-                elif pil_image.mode == "RGBA":
-                    data = pil_image.tobytes("raw", "RGBA")
-                    qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 4, QImage.Format_RGBA8888)
-                else:
-                    # Convert to RGB for other modes
-                    pil_image = pil_image.convert("RGB")
-                    data = pil_image.tobytes("raw", "RGB")
-                    qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 3, QImage.Format_RGB888)
-                
+                # Decoded with proper rotation, or taken from the image cache
+                # if the leaderboard was opened before
+                qimage = load_image(photo_path, (120, 120))  # Larger thumbnail for touch screen
                 pixmap = QPixmap.fromImage(qimage)
                 
                 thumbnail = QLabel()
@@ -2,9 +2,10 @@ import os
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QPushButton, QLabel, QSizePolicy, QProgressBar,
                             QScrollArea, QFrame, QDialog)
-from PyQt5.QtCore import Qt, pyqtSignal, QSize
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QTimer
 from PyQt5.QtGui import QPixmap, QFont
 
+from gui.image_loader import DISPLAY_SIZE, ImageLoader
 from gui.leaderboard_dialog import LeaderboardDialog
 from gui.photo_widget import PhotoWidget
 from utils.file_renamer import rename_photos
@@ -12,7 +13,7 @@ from utils.file_renamer import rename_photos
 class MatchupScreen(QMainWindow):
     finished = pyqtSignal()
     
-    def __init__(self, photo_files, rating_system, output_dir=None):
+    def __init__(self, photo_files, rating_system, output_dir=None, journal=None):
         super().__init__()
         self.setWindowTitle("Photo Matchup")
         
@@ -23,9 +24,27 @@ class MatchupScreen(QMainWindow):
         self.rating_system = rating_system
         self.isFullScreen = False
         
-        # Initialize counters
+        # Session journal (None if it could not be created), plus an engine
+        # snapshot every so many taps to keep resuming fast
+        self.journal = journal
+        self.snapshot_every = 500
+        
+        # Initialize counters (a resumed session continues its count)
         self.total_matchups = self.rating_system.estimated_matchups()
-        self.completed_matchups = 0
+        self.completed_matchups = journal.record_count if journal is not None else 0
+        
+        # Commit the journal now and then even when no taps arrive
+        if self.journal is not None:
+            self.journal_timer = QTimer(self)
+            self.journal_timer.timeout.connect(self.journal.commit)
+            self.journal_timer.start(int(self.journal.commit_interval * 1000))
+        
+        # Photos are decoded on worker threads so taps never wait on the GUI thread
+        self.image_loader = ImageLoader(parent=self)
+        self.image_loader.loaded.connect(self.image_loaded)
+        
+        # Matchups ahead whose photos are decoded while the current pair is shown
+        self.lookahead = 2
         
         # Set up the UI
         central_widget = QWidget()
@@ -87,6 +106,8 @@ class MatchupScreen(QMainWindow):
         
         self.left_photo.clicked.connect(lambda: self.photo_selected(0))
         self.right_photo.clicked.connect(lambda: self.photo_selected(1))
+        self.left_photo.source_too_small.connect(lambda: self.decode_larger(self.left_photo))
+        self.right_photo.source_too_small.connect(lambda: self.decode_larger(self.right_photo))
         
         photos_layout.addWidget(self.left_photo)
         photos_layout.addWidget(self.right_photo)
@@ -141,30 +162,86 @@ class MatchupScreen(QMainWindow):
             self.finish_matchups()
             return
         
-        # Update photos
-        self.left_photo.load_photo(photo1)
-        self.right_photo.load_photo(photo2)
-        
-        # Update progress
+        # Update photos: both are decoded in parallel, along with the photos
+        # of the matchups expected next. Anything decoded for a matchup that
+        # did not come up is dropped. Engines that keep a pending pair list
+        # the one on screen first, hence the extra one
+        upcoming = self.rating_system.peek_next_matchups(self.lookahead + 1)
+        self.image_loader.release_requests()
+        self.image_loader.set_max_size(self.display_size())
+        self.image_loader.prefetch([photo1, photo2] + [photo for pair in upcoming for photo in pair])
+        for widget, photo in ((self.left_photo, photo1), (self.right_photo, photo2)):
+            image = self.image_loader.request(photo)
+            if image is not None:
+                widget.show_image(photo, image, self.image_loader.max_size)
+            else:
+                widget.show_pending(photo)
+        
+        # Update progress. Systems that stop once their ranking settles
+        # revise their estimate as they go, so the range follows it
         self.completed_matchups += 1
+        total_matchups = self.rating_system.estimated_matchups()
+        if total_matchups != self.total_matchups:
+            self.total_matchups = total_matchups
+            self.progress_bar.setRange(0, self.total_matchups)
         self.progress_bar.setValue(self.completed_matchups)
         self.progress_label.setText(f"Matchup {self.completed_matchups} of ~{self.total_matchups}")
     
+    def display_size(self):
+        """Return the size photos are decoded to fit: what the photo widgets show
+        
+        Never below DISPLAY_SIZE (the widgets are not laid out yet for the
+        first matchup), and rounded up to 100 pixels so small changes in
+        window size keep hitting the same cache entries.
+        """
+        sizes = [widget.target_size() for widget in (self.left_photo, self.right_photo)]
+        width = max([DISPLAY_SIZE[0]] + [w for w, _ in sizes])
+        height = max([DISPLAY_SIZE[1]] + [h for _, h in sizes])
+        return -(-width // 100) * 100, -(-height // 100) * 100
+    
+    def decode_larger(self, widget):
+        """Decode the photo of a widget again, in the background, at the size it is shown"""
+        self.image_loader.set_max_size(self.display_size())
+        image = self.image_loader.request(widget.photo_path)
+        if image is not None:
+            widget.show_image(widget.photo_path, image, self.image_loader.max_size)
+    
+    def image_loaded(self, photo_path, image):
+        """Show a photo decoded in the background if it is still on screen
+        
+        That is a photo still loading, or one shown smaller than decoded until now.
+        """
+        for widget in (self.left_photo, self.right_photo):
+            if widget.photo_path != photo_path:
+                continue
+            if widget.pending or (widget.source is not None and widget.needs_larger_source()):
+                widget.show_image(photo_path, image, self.image_loader.max_size)
+    
     def photo_selected(self, selected_index):
         """Handle photo selection"""
+        # A result only counts once both photos are on screen
+        if self.left_photo.pending or self.right_photo.pending:
+            return
+        
         winner = self.left_photo.photo_path if selected_index == 0 else self.right_photo.photo_path
         loser = self.right_photo.photo_path if selected_index == 0 else self.left_photo.photo_path
         
-        # Update ratings
+        # Journal the result first, then update ratings
+        if self.journal is not None:
+            self.journal.append(self.rating_system.photo_to_index[winner],
+                                self.rating_system.photo_to_index[loser])
         self.rating_system.update_ratings(winner, loser)
+        if self.journal is not None and self.journal.record_count % self.snapshot_every == 0:
+            self.save_snapshot()
         
         # Load next matchup
         self.next_matchup()
     
     def show_leaderboard(self):
         """Show the leaderboard dialog"""
-        rankings = self.rating_system.get_current_rankings()
-        dialog = LeaderboardDialog(rankings[:10], self)
+        # Only the top of the board is shown, so skip sorting the rest
+        rankings = self.rating_system.get_top_rankings(10)
+        dialog = LeaderboardDialog(rankings, self)
         
         # Use the same display mode (fullscreen or windowed) for the dialog
         if self.isFullScreen:
@@ -179,6 +256,23 @@ class MatchupScreen(QMainWindow):
         self.finished.emit()
         self.close()
     
+    def save_snapshot(self):
+        """Snapshot the rating system next to the journal"""
+        try:
+            self.journal.save_snapshot(self.rating_system)
+        except OSError as e:
+            print(f"Error saving session snapshot: {e}")
+    
+    def closeEvent(self, event):
+        """Stop decoding, then snapshot and commit the journal when the window closes"""
+        self.image_loader.shutdown()
+        if self.journal is not None:
+            self.journal_timer.stop()
+            if not self.journal.closed:
+                self.save_snapshot()
+                self.journal.close()
+        super().closeEvent(event)
+    
     def finish_matchups(self):
         """Handle completion of all matchups"""
         # Get final rankings
@@ -190,6 +284,10 @@ class MatchupScreen(QMainWindow):
         else:
             rename_photos(rankings)
         
+        # The session is complete, so there is nothing left to resume
+        if self.journal is not None:
+            self.journal.discard()
+        
         # Show summary dialog with option to return home
         from PyQt5.QtWidgets import QMessageBox
         
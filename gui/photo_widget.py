@@ -1,19 +1,36 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QSizePolicy)
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 from PyQt5.QtGui import QPixmap, QImage
-from PIL import Image, ImageQt
-from PIL.ImageOps import exif_transpose
 import os
 import traceback
 
+from gui.image_loader import DISPLAY_SIZE, load_image
+
 class PhotoWidget(QWidget):
     clicked = pyqtSignal()
     
+    # The photo on show was decoded smaller than it is shown (after
+    # show_image or a resize)
+    source_too_small = pyqtSignal()
+    
     def __init__(self):
         super().__init__()
         self.setMinimumSize(240, 240)  # Even smaller size for Pi screen
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.photo_path = None
+        self.pending = False  # Waiting for the photo to be decoded
+        
+        # Decoded photo on show, kept so resizing rescales it from memory,
+        # and the box it was decoded to fit
+        self.source = None
+        self.source_size = DISPLAY_SIZE
+        
+        # While the widget is being resized the photo is scaled the fast way;
+        # once resizing has paused this long it is scaled smoothly
+        self.smooth_timer = QTimer(self)
+        self.smooth_timer.setSingleShot(True)
+        self.smooth_timer.setInterval(150)
+        self.smooth_timer.timeout.connect(self.resize_settled)
         
         # Set up layout
         layout = QVBoxLayout(self)
@@ -43,47 +60,55 @@ class PhotoWidget(QWidget):
         """)
     
     def load_photo(self, photo_path):
-        """Load and display a photo with proper orientation"""
-        self.photo_path = photo_path
+        """Load and display a photo with proper orientation (decoding it here, on the GUI thread, unless cached)"""
         if not photo_path:
+            self.photo_path = None
+            self.pending = False
+            self.source = None
             self.photo_label.clear()
             self.filename_label.setText("")
             return
         
         try:
-            # Open image with Pillow and fix rotation using exif_transpose
-            pil_image = Image.open(photo_path)
-            pil_image = exif_transpose(pil_image)
-            
-            # Resize to a smaller size for better performance on Raspberry Pi
-            max_size = (600, 600)  # Reduced size for Raspberry Pi
-            if pil_image.width > max_size[0] or pil_image.height > max_size[1]:
-                pil_image.thumbnail(max_size, Image.LANCZOS)
-            
-            # Convert PIL image to QImage then to QPixmap
-            if pil_image.mode == "RGB":
-                data = pil_image.tobytes("raw", "RGB")
-                qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 3, QImage.Format_RGB888)
-            elif pil_image.mode == "RGBA":
-                data = pil_image.tobytes("raw", "RGBA")
-                qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 4, QImage.Format_RGBA8888)
-            else:
-                # Convert to RGB for other modes
-                pil_image = pil_image.convert("RGB")
-                data = pil_image.tobytes("raw", "RGB")
-                qimage = QImage(data, pil_image.width, pil_image.height, pil_image.width * 3, QImage.Format_RGB888)
-            
-            pixmap = QPixmap.fromImage(qimage)
-            
-            # Scale pixmap to fit label while preserving aspect ratio
-            scaled_pixmap = pixmap.scaled(
-                self.photo_label.width() - 10,  # Leave a small margin
-                self.photo_label.height() - 10,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
+            qimage = load_image(photo_path)
+        except Exception as e:
+            print(f"Error loading image {photo_path}: {str(e)}")
+            traceback.print_exc()
+            qimage = QImage()
+        self.show_image(photo_path, qimage)
+    
+    def show_pending(self, photo_path):
+        """Show photo_path as on its way while it is decoded in the background"""
+        self.photo_path = photo_path
+        self.pending = True
+        self.source = None
+        self.photo_label.clear()
+        self.photo_label.setText("Loading...")
+        self.filename_label.setText("")
+    
+    def show_image(self, photo_path, qimage, max_size=DISPLAY_SIZE):
+        """Display an already decoded photo (a null QImage shows the photo as unreadable)
+        
+        max_size is the box the photo was decoded to fit.
+        """
+        self.photo_path = photo_path
+        self.pending = False
+        self.source = None
+        self.smooth_timer.stop()
+        if qimage.isNull():
+            self.photo_label.setText(f"Error loading image")
+            self.filename_label.setText(os.path.basename(photo_path))
+            return
+        
+        try:
+            self.source = QPixmap.fromImage(qimage)
+            self.source_size = tuple(max_size)
+            self.rescale(Qt.SmoothTransformation)
             
-            self.photo_label.setPixmap(scaled_pixmap)
+            # Shown larger than decoded (e.g. fullscreen on a large monitor):
+            # whoever supplied the photo can decode it larger in the background
+            if self.needs_larger_source():
+                self.source_too_small.emit()
             
             # Truncate filename if too long for small screen
             filename = os.path.basename(photo_path)
@@ -97,6 +122,40 @@ class PhotoWidget(QWidget):
             self.photo_label.setText(f"Error loading image")
             self.filename_label.setText(os.path.basename(photo_path))
     
+    def target_size(self):
+        """Return the (width, height) the photo is scaled to fit"""
+        return self.photo_label.width() - 10, self.photo_label.height() - 10  # Leave a small margin
+    
+    def rescale(self, transformation):
+        """Scale the decoded photo to fit the label while preserving aspect ratio"""
+        width, height = self.target_size()
+        if width <= 0 or height <= 0:
+            return
+        self.photo_label.setPixmap(self.source.scaled(width, height, Qt.KeepAspectRatio, transformation))
+    
+    def needs_larger_source(self):
+        """Return True if the photo is shown larger than decoded and decoding is what made it smaller"""
+        width, height = self.target_size()
+        box_width, box_height = self.source_size
+        shown_larger = min(width / self.source.width(), height / self.source.height()) > 1
+        
+        # A photo shrunk to fit its box fills it in one direction; a smaller
+        # original would not get any larger from decoding it again
+        shrunk = self.source.width() >= box_width or self.source.height() >= box_height
+        return shown_larger and shrunk and (width > box_width or height > box_height)
+    
+    def resize_settled(self):
+        """Scale the photo smoothly once resizing has paused, asking for a larger decode if it has grown"""
+        if self.source is None:
+            return
+        
+        self.rescale(Qt.SmoothTransformation)
+        
+        # Decoded in the background like after show_image; the larger photo
+        # replaces this one when it arrives
+        if self.needs_larger_source():
+            self.source_too_small.emit()
+    
     def mousePressEvent(self, event):
         """Handle click/touch events"""
         self.setStyleSheet("""
@@ -107,7 +166,7 @@ class PhotoWidget(QWidget):
         super().mousePressEvent(event)
     
     def mouseReleaseEvent(self, event):
-        """Handle releasing the click/touch"""
+        """Handle releasing the click/touch (ignored until the photo is shown)"""
         self.setStyleSheet("""
             QWidget {
                 background-color: #353535;
@@ -117,11 +176,14 @@ class PhotoWidget(QWidget):
                 cursor: pointer;
             }
         """)
-        self.clicked.emit()
+        if not self.pending:
+            self.clicked.emit()
         super().mouseReleaseEvent(event)
     
     def resizeEvent(self, event):
-        """Handle resize events by rescaling the photo"""
-        if self.photo_path:
-            self.load_photo(self.photo_path)
+        """Handle resize events by rescaling the photo from memory"""
+        if self.source is not None:
+            # Fast scaling for every resize step, a smooth one once they stop
+            self.rescale(Qt.FastTransformation)
+            self.smooth_timer.start()
         super().resizeEvent(event)
@@ -1,20 +1,167 @@
+import numpy as np
+from rating_systems.snapshot import read_snapshot, write_snapshot
+
+# Rankings are built and handed out this many photos at a time by iter_rankings
+RANKING_CHUNK = 4096
+
+def _top_ids(scores, k):
+    """Return the ids of the k highest scores, best first
+    
+    Uses a partial selection, O(n + k log k), and breaks ties by lower id
+    so the result is exactly the start of a stable sort by score.
+    """
+    n = len(scores)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    if k * 4 >= n:
+        # Most of the collection is wanted anyway
+        return np.argsort(-scores, kind="stable")[:k]
+    
+    # k-th highest score, then everything above it and the lowest ids tied with it
+    cut = -np.partition(-scores, k - 1)[k - 1]
+    above = np.flatnonzero(scores > cut)
+    tied = np.flatnonzero(scores == cut)[:k - len(above)]
+    ids = np.concatenate([above, tied])
+    return ids[np.lexsort((ids, -scores[ids]))]
+
 class BaseRating:
     """Base class for all rating systems"""
     
     def __init__(self, photo_files):
         self.photo_files = list(photo_files)
+        
+        # Single path <-> id table shared by all engines (ids index photo_files)
+        self.photo_to_index = {photo: i for i, photo in enumerate(self.photo_files)}
+        
+        # Results received in bulk that order-driven engines have not asked for yet:
+        # (low_id * n + high_id) -> winner id
+        self.known_outcomes = {}
+        
+        # Matchups drawn ahead of time by engines that pick pairs at random,
+        # as (id1, id2) pairs in the order they will be shown
+        self.reserved = []
         self.name = "Base Rating System"
     
     def get_next_matchup(self):
         """Return the next pair of photos to compare (photo1, photo2)"""
         raise NotImplementedError("Subclasses must implement this method")
     
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming (photo1, photo2) pairs without committing to them
+        
+        The first pair is the one get_next_matchup will return next (for
+        engines that keep a pending pair, the one it returns now). Later
+        pairs are the ones that follow unless the results in between change
+        them, so they are good for preparing photos ahead of time.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _draw_matchup(self):
+        """Pick a new pair of photo ids at random (engines that use reservations)"""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _next_reserved(self):
+        """Return the first reserved pair of photo ids, or a newly drawn one"""
+        if self.reserved:
+            return self.reserved.pop(0)
+        return self._draw_matchup()
+    
+    def _reserve_matchups(self, k):
+        """Draw pairs ahead until k are reserved, and return them as photo pairs"""
+        if self.is_complete():
+            return []
+        while len(self.reserved) < k:
+            self.reserved.append(self._draw_matchup())
+        return [(self.photo_files[a], self.photo_files[b]) for a, b in self.reserved[:k]]
+    
+    def _release_reserved(self, ids=None):
+        """Drop reserved pairs that involve any of ids (all of them if ids is None)
+        
+        Called when results change those photos, since the pairs were drawn
+        from their old state.
+        """
+        if ids is None:
+            self.reserved = []
+        elif self.reserved:
+            self.reserved = [pair for pair in self.reserved if pair[0] not in ids and pair[1] not in ids]
+    
     def update_ratings(self, winner, loser):
         """Update ratings based on a matchup result"""
         raise NotImplementedError("Subclasses must implement this method")
     
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _remember_outcomes(self, winners, losers):
+        """Store bulk results for engines that can only use the pair they ask about"""
+        n = len(self.photo_files)
+        known = self.known_outcomes
+        for winner, loser in zip(list(winners), list(losers)):
+            winner, loser = int(winner), int(loser)
+            if winner < loser:
+                known[winner * n + loser] = winner
+            elif loser < winner:
+                known[loser * n + winner] = winner
+    
+    def _take_known_outcome(self, a, b):
+        """Return (and consume) the stored winner id of a vs b, or None"""
+        if not self.known_outcomes:
+            return None
+        key = a * len(self.photo_files) + b if a < b else b * len(self.photo_files) + a
+        return self.known_outcomes.pop(key, None)
+    
+    def snapshot(self, path, metadata=None):
+        """Write the engine state to a compact binary snapshot file"""
+        state, arrays = self._snapshot_state()
+        write_snapshot(path, self.name, self.photo_files, state, arrays, metadata)
+    
+    def restore(self, path):
+        """Load state written by snapshot() for the same engine and photos
+        
+        Arrays are memory-mapped rather than copied. Returns the metadata
+        passed to snapshot().
+        """
+        state, arrays, metadata = read_snapshot(path, self.name, self.photo_files)
+        self._restore_state(state, arrays)
+        return metadata
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        count = len(self.known_outcomes)
+        arrays = {
+            "known_keys": np.fromiter(self.known_outcomes.keys(), dtype=np.int64, count=count),
+            "known_winners": np.fromiter(self.known_outcomes.values(), dtype=np.int64, count=count),
+        }
+        return {}, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        self.known_outcomes = dict(zip(arrays["known_keys"].tolist(), arrays["known_winners"].tolist()))
+        self._release_reserved()
+    
     def get_current_rankings(self):
         """Return sorted list of (photo_path, score) tuples"""
+        return list(self.iter_rankings())
+    
+    def get_top_rankings(self, k):
+        """Return the best k (photo_path, score) tuples, in the same order as get_current_rankings"""
+        scores = self._ranking_scores()
+        ids = _top_ids(scores, k)
+        return list(zip([self.photo_files[i] for i in ids.tolist()], scores[ids].tolist()))
+    
+    def iter_rankings(self):
+        """Yield (photo_path, score) tuples best first, building them only as they are consumed"""
+        # Copied, so results applied while the export is being read don't change it
+        scores = np.array(self._ranking_scores())
+        order = np.argsort(-scores, kind="stable")
+        for start in range(0, len(order), RANKING_CHUNK):
+            ids = order[start:start + RANKING_CHUNK]
+            yield from zip([self.photo_files[i] for i in ids.tolist()], scores[ids].tolist())
+    
+    def _ranking_scores(self):
+        """Return the array of per-id scores that rankings are sorted by (score-based engines)"""
         raise NotImplementedError("Subclasses must implement this method")
     
     def is_complete(self):
@@ -1,77 +1,99 @@
 from rating_systems.base_rating import BaseRating
+from rating_systems.pair_counts import PairCounts
+from rating_systems.count_buckets import CountBuckets
+from rating_systems.convergence import ConvergenceMonitor
 import random
-import math
 import numpy as np
-from collections import defaultdict
 
 class BradleyTerryRating(BaseRating):
     """Bradley-Terry model for pairwise comparisons"""
     
-    def __init__(self, photo_files):
+    def __init__(self, photo_files, refit_every=1, confidence=0.8):
         super().__init__(photo_files)
         self.name = "Bradley-Terry"
         
-        # Maps photo paths to indices
-        self.photo_to_index = {photo: i for i, photo in enumerate(photo_files)}
-        self.index_to_photo = {i: photo for i, photo in enumerate(photo_files)}
-        
         # Number of photos
         self.n = len(photo_files)
         
-        # Wins matrix: wins[i][j] = number of times i beat j
-        self.wins = np.zeros((self.n, self.n))
+        # Sparse wins table: only pairs that have been compared take memory
+        self.wins = PairCounts(self.n)
         
         # Initialize strengths (log-skills)
         self.strengths = np.zeros(self.n)
         
-        # Initialize comparison counts
+        # Strengths as fitted at the last convergence check. Each check
+        # continues this fit, so the readings don't depend on whether the
+        # results came tap by tap or in a batch
+        self.check_strengths = np.zeros(self.n)
+        
+        # Solver settings
+        self.prior_weight = 0.5  # Virtual win and loss against an average photo (keeps strengths finite)
+        self.tolerance = 1e-6  # Stop once no log-strength moves more than this
+        self.iterations_per_tap = 10  # Cap on solver work after a single comparison
+        self.max_iterations = 500  # Cap for a full refit (e.g. before reporting rankings)
+        self.iterations_per_check = 20  # Cap on solver work at a convergence check
+        self.refit_every = refit_every  # Refit every k comparisons; 0 = only when rankings are requested
+        self.converged = True  # False while the strengths lag behind the recorded wins
+        
+        # Initialize comparison counts. At most 10 comparisons per photo
+        # are made; the session ends earlier once the strengths' standard
+        # errors put the order at the requested confidence, or the order
+        # stops changing
         self.total_comparisons = 0
-        self.target_comparisons = self.n * 10  # ~10 comparisons per photo
+        self.target_comparisons = self.n * 10
+        self.convergence = ConvergenceMonitor(self.n, self.target_comparisons, confidence=confidence)
         
-        # Track which photos have been compared
-        self.comparisons = defaultdict(int)
+        # Per-photo comparison counts (running aggregate kept by the wins table)
+        self.comparisons = self.wins.comparisons
+        
+        # Photo ids bucketed by comparison count, least compared first
+        self.count_buckets = CountBuckets(self.n)
         
         # Current matchup
         self.current_matchup = None
     
     def get_next_matchup(self):
         """Return the next pair of photos to compare"""
-        if self.total_comparisons >= self.target_comparisons:
+        if self.is_complete():
             return None, None
-            
-        # Get photos with fewest comparisons first
-        photos = sorted(self.photo_files, 
-                      key=lambda p: self.comparisons[p])
         
-        # Select first photo from least compared third
-        first_third = max(1, len(photos) // 3)
-        photo1 = random.choice(photos[:first_third])
-        
-        # Select second photo that hasn't been compared with photo1 many times
-        remaining = [p for p in photos if p != photo1]
-        
-        idx1 = self.photo_to_index[photo1]
-        remaining_weights = []
-        
-        for p in remaining:
-            idx2 = self.photo_to_index[p]
-            # Lower weight if they've been compared more times
-            comparison_count = self.wins[idx1, idx2] + self.wins[idx2, idx1]
-            # Sigmoid-like scale: more comparisons = lower weight
-            weight = 1.0 / (1.0 + comparison_count)
-            remaining_weights.append(weight)
-        
-        # Normalize weights
-        total = sum(remaining_weights)
-        if total > 0:
-            remaining_weights = [w/total for w in remaining_weights]
-            photo2 = random.choices(remaining, weights=remaining_weights, k=1)[0]
-        else:
-            photo2 = random.choice(remaining)
+        # Taken from the pairs reserved by peek_next_matchups, if any
+        idx1, idx2 = self._next_reserved()
         
+        photo1 = self.photo_files[idx1]
+        photo2 = self.photo_files[idx2]
         self.current_matchup = (photo1, photo2)
         return self.current_matchup
     
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming pairs, drawn now and reserved until they are shown"""
+        return self._reserve_matchups(k)
+    
+    def _draw_matchup(self):
+        """Pick a new pair of photo ids"""
+        # Select first photo from least compared third
+        first_third = max(1, self.n // 3)
+        idx1 = self.count_buckets.pick_least_compared(first_third)
+        
+        # Select second photo that hasn't been compared with photo1 many times.
+        # Weight is 1 / (1 + times compared), so only photos already compared
+        # with photo1 need individual weights; all others share weight 1
+        adjacent = self.wins.adjacency.get(idx1, {})
+        adjacent_ids = list(adjacent)
+        adjacent_weights = [1.0 / (1.0 + count) for count in adjacent.values()]
+        adjacent_total = sum(adjacent_weights)
+        unseen_total = self.n - 1 - len(adjacent)
+        
+        if random.random() * (adjacent_total + unseen_total) < adjacent_total:
+            idx2 = random.choices(adjacent_ids, weights=adjacent_weights, k=1)[0]
+        else:
+            # Uniform over photos never compared with photo1 (rejection sampling)
+            idx2 = random.randrange(self.n)
+            while idx2 == idx1 or idx2 in adjacent:
+                idx2 = random.randrange(self.n)
+        
+        return idx1, idx2
+    
     def update_ratings(self, winner, loser):
         """Update ratings based on comparison result"""
         # Verify this is the current pair
@@ -82,59 +104,155 @@ class BradleyTerryRating(BaseRating):
         winner_idx = self.photo_to_index[winner]
         loser_idx = self.photo_to_index[loser]
         
-        # Update wins matrix
-        self.wins[winner_idx, loser_idx] += 1
-        
-        # Update comparison counts
-        self.comparisons[winner] += 1
-        self.comparisons[loser] += 1
+        # Update wins table (also updates per-photo win and comparison totals)
+        self.wins.add(winner_idx, loser_idx)
+        self.count_buckets.increment(winner_idx)
+        self.count_buckets.increment(loser_idx)
         self.total_comparisons += 1
         
-        # Re-estimate strengths using MM algorithm
-        self._update_strengths()
+        # Re-estimate strengths using MM algorithm (warm-started, capped per tap)
+        self.converged = False
+        if self.refit_every and self.total_comparisons % self.refit_every == 0:
+            self._update_strengths(self.iterations_per_tap)
+        self.convergence.observe(self)
         
+        self._release_reserved((winner_idx, loser_idx))
         self.current_matchup = None
     
-    def _update_strengths(self):
-        """Update strength parameters using Minorization-Maximization algorithm"""
-        # Skip if not enough data yet
-        if self.total_comparisons < self.n:
-            return
-            
-        # Perform 5 iterations of MM algorithm
-        for _ in range(5):
-            # Calculate total wins for each photo
-            w_i = np.sum(self.wins, axis=1)
-            
-            # Calculate expected number of wins given current strengths
-            p = np.exp(self.strengths)
-            p_sum = np.sum(p)
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        keep = winners != losers
+        winners, losers = winners[keep], losers[keep]
+        self._release_reserved()
+        
+        # Applied in spans ending where convergence is checked, so the checks
+        # see the same wins as when playing tap by tap
+        for start, stop in self.convergence.spans(len(winners)):
+            self._apply_results(winners[start:stop], losers[start:stop])
+            self.convergence.observe(self, stop - start)
+        
+        # One full refit for the whole batch, continuing the last check's fit
+        if not self.converged:
+            self.strengths = self.check_strengths.copy()
+            self._update_strengths(self.max_iterations)
+    
+    def _apply_results(self, winners, losers):
+        """Apply results given as arrays of winner and loser photo ids"""
+        # Accumulate every result; pair selection only looks at the counts,
+        # so the refit waits until the end of the batch
+        self.wins.add_many(winners, losers)
+        self.count_buckets.rebuild(self.comparisons)
+        self.total_comparisons += len(winners)
+        self.converged = False
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(
+            prior_weight=self.prior_weight, tolerance=self.tolerance,
+            iterations_per_tap=self.iterations_per_tap, max_iterations=self.max_iterations,
+            iterations_per_check=self.iterations_per_check,
+            refit_every=self.refit_every, converged=self.converged,
+            total_comparisons=self.total_comparisons, target_comparisons=self.target_comparisons,
+        )
+        arrays.update(self.wins.to_arrays())
+        arrays["strengths"] = self.strengths
+        arrays["check_strengths"] = self.check_strengths
+        arrays["count_order"] = np.array(self.count_buckets.order, dtype=np.int64)
+        
+        convergence_state, convergence_arrays = self.convergence.to_state()
+        state["convergence"] = convergence_state
+        arrays.update(convergence_arrays)
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        for name in ("prior_weight", "tolerance", "iterations_per_tap", "max_iterations",
+                     "iterations_per_check", "refit_every", "converged", "total_comparisons",
+                     "target_comparisons"):
+            setattr(self, name, state[name])
+        self.convergence.load_state(state["convergence"], arrays)
+        
+        self.wins.load(arrays)
+        self.comparisons = self.wins.comparisons
+        self.strengths = arrays["strengths"]
+        self.check_strengths = arrays["check_strengths"]
+        self.count_buckets.rebuild(self.comparisons, arrays["count_order"])
+        self.current_matchup = None
+    
+    def _update_strengths(self, max_iterations):
+        """Update strength parameters using Minorization-Maximization algorithm
+        
+        Returns True on convergence.
+        """
+        self.strengths, converged = self._fit(self.strengths, max_iterations)
+        self.converged = self.converged or converged
+        return self.converged
+    
+    def _fit(self, strengths, max_iterations):
+        """Return (strengths, converged) after up to max_iterations MM steps from strengths
+        
+        Vectorized MM (Zermelo) iteration over the observed pairs only.
+        """
+        low, high, low_wins, high_wins = self.wins.active()
+        pair_counts = (low_wins + high_wins).astype(np.float64)
+        
+        # Total wins for each photo plus the prior's virtual win
+        w_i = self.wins.win_totals + self.prior_weight
+        
+        gamma = np.exp(strengths)
+        converged = False
+        for _ in range(max_iterations):
+            # Sum of n_ij / (gamma_i + gamma_j) over each photo's opponents
+            inv = pair_counts / (gamma[low] + gamma[high])
+            denom = np.bincount(low, weights=inv, minlength=self.n)
+            denom += np.bincount(high, weights=inv, minlength=self.n)
             
-            # Calculate new strengths
-            new_strengths = np.zeros(self.n)
-            for i in range(self.n):
-                if w_i[i] > 0:  # Only update if the photo has won at least once
-                    new_strengths[i] = math.log(w_i[i]) - math.log(p_sum - p[i])
+            # Prior: one virtual win and one virtual loss against gamma = 1
+            denom += 2 * self.prior_weight / (gamma + 1.0)
             
-            # Update strengths (with regularization to prevent divergence)
-            self.strengths = 0.9 * self.strengths + 0.1 * new_strengths
+            new_gamma = w_i / denom
+            change = np.max(np.abs(np.log(new_gamma) - np.log(gamma)))
+            gamma = new_gamma
+            if change < self.tolerance:
+                converged = True
+                break
+        
+        return np.log(gamma), converged
+    
+    def _ranking_scores(self):
+        """Return the array of per-id scores that rankings are sorted by"""
+        # Finish any deferred or capped refit before reporting
+        if not self.converged:
+            self._update_strengths(self.max_iterations)
+        
+        # Convert to probability scale (0-100) for more intuitive scores
+        gamma = np.exp(self.strengths)
+        return 100 * gamma / (1 + gamma)
     
-    def get_current_rankings(self):
-        """Return sorted list of (photo_path, score) tuples"""
-        # Convert strengths to photo paths and scores
-        scores = []
-        for i, strength in enumerate(self.strengths):
-            photo = self.index_to_photo[i]
-            # Convert to probability scale (0-100) for more intuitive scores
-            score = 100 * np.exp(strength) / (1 + np.exp(strength))
-            scores.append((photo, score))
-        
-        return sorted(scores, key=lambda x: x[1], reverse=True)
+    def _convergence_estimates(self):
+        """Return (scores, posterior means, posterior sds) for the convergence monitor"""
+        # A short warm-started fit, not a full refit: checks come every n taps
+        self.check_strengths, _ = self._fit(self.check_strengths, self.iterations_per_check)
+        strengths = self.check_strengths
+        
+        # Standard error of each log-strength from the diagonal of the Fisher
+        # information: n_ij * p_ij * (1 - p_ij) summed over opponents, plus the prior
+        low, high, low_wins, high_wins = self.wins.active()
+        gamma = np.exp(strengths)
+        pair_info = (low_wins + high_wins) * gamma[low] * gamma[high] / (gamma[low] + gamma[high]) ** 2
+        info = np.bincount(low, weights=pair_info, minlength=self.n)
+        info += np.bincount(high, weights=pair_info, minlength=self.n)
+        info += 2 * self.prior_weight * gamma / (1.0 + gamma) ** 2
+        return strengths, strengths, 1.0 / np.sqrt(info)
     
     def is_complete(self):
-        """Return True if all scheduled comparisons have been made"""
-        return self.total_comparisons >= self.target_comparisons
+        """Return True once the ranking has settled"""
+        return self.convergence.complete
     
     def estimated_matchups(self):
-        """Return total number of matchups"""
-        return self.target_comparisons
+        """Return the expected total number of matchups (revised as the ranking settles)"""
+        return self.convergence.estimated_taps()
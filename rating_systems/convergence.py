@@ -0,0 +1,175 @@
+import math
+import numpy as np
+from rating_systems.rank_metrics import kendall_tau
+
+class ConvergenceMonitor:
+    """Decides when the ranking of a score-based engine has settled
+    
+    Every check_every taps two readings are taken:
+    - stability: Kendall tau between the scores of a fixed sample of photos
+      now and at the previous check (rolling tau)
+    - confidence, for engines with posterior uncertainties: the expected
+      Kendall tau between the current order and the true one, estimated
+      from how much the posteriors of a fixed sample of photo pairs overlap
+    
+    The session is complete once confidence reaches the requested level,
+    or the order has stopped changing (stability), on `patience` checks in
+    a row. It never ends before min_taps and always ends by the engine's
+    fixed budget (initial_estimate), so the rule can only shorten sessions.
+    """
+    
+    def __init__(self, n, initial_estimate, confidence=0.8, stability=0.98,
+                 min_taps_per_photo=2, patience=2, sample_size=2048):
+        self.n = n
+        
+        # Stopping rule
+        self.confidence = confidence
+        self.stability = stability
+        self.patience = patience
+        self.max_taps = initial_estimate
+        self.min_taps = min(min_taps_per_photo * n, self.max_taps)
+        self.check_every = max(n, 5)
+        
+        # Expected session length: the initial estimate until there are
+        # enough readings to project from, then revised at every check
+        self.estimate = initial_estimate
+        self.projected = False
+        
+        # Fixed samples of photos and of distinct photo pairs, seeded by n so a
+        # resumed or replayed session reads the same ones
+        rng = np.random.default_rng(n)
+        if n <= sample_size:
+            self.sample = np.arange(n)
+        else:
+            self.sample = np.sort(rng.choice(n, sample_size, replace=False))
+        self.pair_first = rng.integers(0, n, 2 * sample_size)
+        self.pair_second = rng.integers(0, max(1, n - 1), 2 * sample_size)
+        self.pair_second += self.pair_second >= self.pair_first
+        
+        self.taps = 0
+        self.next_check = self.check_every
+        self.streak = 0  # Consecutive checks that met the stopping rule
+        self.previous = None  # Sample scores at the last check
+        self.history = []  # [taps, stability, confidence] per check
+        self.complete = n < 2
+    
+    def observe(self, engine, taps=1):
+        """Count results applied to engine, checking convergence when one is due"""
+        self.taps += taps
+        if self.taps >= self.next_check and not self.complete:
+            self.check(engine)
+            self.next_check = (self.taps // self.check_every + 1) * self.check_every
+        if self.taps >= self.max_taps:
+            self.complete = True
+    
+    def spans(self, count):
+        """Yield (start, stop) spans of a batch of count results, each ending at a check
+        
+        Applying a batch span by span, calling observe() after each, checks at
+        the same tap counts (and so on the same state) as playing tap by tap.
+        """
+        start = 0
+        while start < count:
+            if self.complete:
+                yield start, count  # No more checks to line up with
+                return
+            stop = min(count, start + max(1, self.next_check - self.taps))
+            yield start, stop
+            start = stop
+    
+    def check(self, engine):
+        """Take the stability and confidence readings and update the stopping state"""
+        scores, means, sds = engine._convergence_estimates()
+        
+        current = np.array(scores, dtype=np.float64)[self.sample]
+        stability = None
+        first_stability = self.previous is not None and all(row[1] is None for row in self.history)
+        if self.previous is not None:
+            stability = kendall_tau(np.argsort(-current, kind="stable"), self.previous)
+        self.previous = current
+        
+        confidence = None
+        if means is not None:
+            # P(pair ordered correctly) = Phi(diff / spread), and 2 * Phi(x) - 1 = erf(x / sqrt(2))
+            first, second = self.pair_first, self.pair_second
+            diff = np.abs(means[first] - means[second])
+            spread = np.sqrt(sds[first] ** 2 + sds[second] ** 2) * math.sqrt(2)
+            confidence = float(np.mean([math.erf(x) for x in (diff / spread).tolist()]))
+        
+        settled = self.taps >= self.min_taps and (
+            (confidence is not None and confidence >= self.confidence)
+            or (stability is not None and stability >= self.stability)
+        )
+        if not settled:
+            self.streak = 0
+        elif first_stability and stability >= self.stability:
+            # The first stability reading vouches for the reading it was compared with too
+            self.streak += 2
+        else:
+            self.streak += 1
+        self.history.append([self.taps, stability, confidence])
+        if self.streak >= self.patience:
+            self.complete = True
+            return
+        
+        projections = [p for p in (self._project(2, self.confidence), self._project(1, self.stability))
+                       if p is not None]
+        if projections:
+            # Averaged with the previous estimate to keep the progress bar steady
+            projection = min(projections)
+            self.estimate = (self.estimate + projection) / 2 if self.projected else projection
+            self.projected = True
+    
+    def estimated_taps(self):
+        """Return the expected session length, projected from the readings so far"""
+        if self.complete:
+            return self.taps
+        
+        # The stopping rule needs the remaining checks of a streak at least
+        remaining_checks = max(0, self.patience - self.streak - 1)
+        floor = max(self.min_taps, self.next_check + remaining_checks * self.check_every)
+        return int(min(self.max_taps, max(self.estimate, floor)))
+    
+    def _project(self, column, target):
+        """Taps at which a reading reaches target, from a power-law fit of its gap to 1"""
+        points = [(row[0], 1.0 - row[column]) for row in self.history if row[column] is not None]
+        points = points[-6:]
+        if len(points) < 3:
+            return None
+        
+        gap = 1.0 - target
+        if points[-1][1] <= gap:
+            return self.taps
+        
+        # log(gap) = a + b * log(taps); the gap must be shrinking to project
+        x = np.log([taps for taps, _ in points])
+        y = np.log([max(g, 1e-9) for _, g in points])
+        b, a = np.polyfit(x, y, 1)
+        if b > -0.05:
+            return None
+        return float(np.exp((math.log(gap) - a) / b))
+    
+    def to_state(self):
+        """Return (dict of plain values, dict of arrays) for a snapshot"""
+        state = {
+            "taps": self.taps, "next_check": self.next_check, "streak": self.streak,
+            "history": self.history, "complete": self.complete,
+            "estimate": self.estimate, "projected": self.projected,
+            "confidence": self.confidence, "stability": self.stability,
+        }
+        previous = self.previous if self.previous is not None else np.zeros(0)
+        return state, {"convergence_previous": previous}
+    
+    def load_state(self, state, arrays):
+        """Load the values and arrays returned by to_state"""
+        self.taps = state["taps"]
+        self.next_check = state["next_check"]
+        self.streak = state["streak"]
+        self.history = state["history"]
+        self.complete = state["complete"]
+        self.estimate = state["estimate"]
+        self.projected = state["projected"]
+        self.confidence = state["confidence"]
+        self.stability = state["stability"]
+        previous = arrays["convergence_previous"]
+        self.previous = np.array(previous) if len(previous) else None
@@ -0,0 +1,29 @@
+# Expected number of comparisons for each rating system, as a function of
+# the number of photos n and (for Top-K) the number of photos to find k.
+# Kept free of engine and NumPy imports so the home screen can show
+# estimates without loading any engine.
+
+def quicksort_comparisons(n, k=None):
+    """Return the typical Quick Sort count, about n log2 n"""
+    return int(n * (n.bit_length() - 1)) if n > 1 else 0
+
+def merge_insertion_comparisons(n, k=None):
+    """Return the Ford-Johnson worst case: sum of ceil(log2(3k/4)) for k = 1..n"""
+    return sum(max(0, (3 * i - 1).bit_length() - 2) for i in range(1, n + 1))
+
+def top_k_comparisons(n, k):
+    """Return n - 1 for the first winner plus ceil(log2 n) for each further place"""
+    if n < 2:
+        return 0
+    k = max(1, min(k, n))
+    return (n - 1) + (k - 1) * (n - 1).bit_length()
+
+def all_pairs_comparisons(n, k=None):
+    """Return n(n-1)/2, one comparison for every pair"""
+    return n * (n - 1) // 2
+
+def per_photo(count):
+    """Return a cost model of count comparisons per photo"""
+    def comparisons(n, k=None):
+        return n * count
+    return comparisons
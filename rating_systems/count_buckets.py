@@ -0,0 +1,60 @@
+import numpy as np
+import random
+
+class CountBuckets:
+    """Photo ids kept ordered by comparison count with O(1) increments
+    
+    Ids with the same count form a contiguous bucket in `order`. Incrementing
+    an id swaps it to the end of its bucket and shifts the bucket boundary,
+    so the least-compared ids are always at the front.
+    """
+    
+    def __init__(self, n):
+        self.n = n
+        
+        # Ids sorted by ascending count, and the position of each id in that list
+        self.order = list(range(n))
+        self.position = list(range(n))
+        self.counts = [0] * n
+        
+        # first[c] is the position where ids with count >= c start
+        self.first = [0, n]
+    
+    def increment(self, index):
+        """Add one comparison to a photo id"""
+        c = self.counts[index]
+        if c + 2 >= len(self.first):
+            self.first.append(self.n)
+        
+        # Swap the id with the last member of its bucket, then shrink the bucket
+        last = self.first[c + 1] - 1
+        pos = self.position[index]
+        other = self.order[last]
+        self.order[pos], self.order[last] = other, index
+        self.position[other], self.position[index] = pos, last
+        
+        self.first[c + 1] = last
+        self.counts[index] = c + 1
+    
+    def rebuild(self, counts, order=None):
+        """Re-bucket all ids from an array of comparison counts
+        
+        order, if given, is a previous `order` to restore as is (the order of
+        ids within a bucket depends on the history of increments).
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        if order is None:
+            order = np.argsort(counts, kind="stable")
+        order = np.asarray(order, dtype=np.int64)
+        position = np.empty(self.n, dtype=np.int64)
+        position[order] = np.arange(self.n)
+        
+        self.order = order.tolist()
+        self.position = position.tolist()
+        self.counts = counts.tolist()
+        max_count = int(counts.max()) if self.n else 0
+        self.first = np.searchsorted(counts[order], np.arange(max_count + 2)).tolist()
+    
+    def pick_least_compared(self, k):
+        """Return a random id among the k least-compared photos"""
+        return self.order[random.randrange(min(k, self.n))]
@@ -1,6 +1,9 @@
 from rating_systems.base_rating import BaseRating
-import random
-import math
+from rating_systems.rating_store import RatingStore, weighted_index
+from rating_systems.weighted_sampler import WeightedSampler
+from rating_systems.rating_index import RatingIndex
+from rating_systems.convergence import ConvergenceMonitor
+import numpy as np
 
 class EloRating(BaseRating):
     """Elo rating system adapted from chess rankings"""
@@ -9,61 +12,66 @@ class EloRating(BaseRating):
         super().__init__(photo_files)
         self.name = "Elo"
         
+        # Per-photo state lives in arrays indexed by photo id
+        self.store = RatingStore(len(self.photo_files))
+        
         # Initialize all photos with base Elo of 1400
-        self.ratings = {photo: 1400 for photo in photo_files}
+        self.ratings = self.store.add_array("ratings", 1400.0)
         
         # Parameter K determines how much ratings change after each comparison
         self.K = 32
         
         # Track number of comparisons for each photo
-        self.comparisons = {photo: 0 for photo in photo_files}
+        self.comparisons = self.store.add_array("comparisons", 0, dtype=np.int32)
+        
+        # First-photo sampler weighted by inverse comparison count
+        self.sampler = WeightedSampler(1.0 / (1.0 + self.comparisons))
+        
+        # Photos ordered by rating, for picking opponents near photo1
+        self.rating_index = RatingIndex(self.ratings)
         
-        # Total matches to perform (approximately 6 per photo)
+        # At most 6 matches per photo; the session ends earlier
+        # once the ranking stops changing. Elo has no uncertainty to
+        # read, and its fixed K keeps ratings moving, so its order is only
+        # asked to settle less tightly than the other systems'
         self.total_matches = len(photo_files) * 6
         self.completed_matches = 0
+        self.convergence = ConvergenceMonitor(len(self.photo_files), self.total_matches, stability=0.9)
         
         # Current matchup
         self.current_matchup = None
     
     def get_next_matchup(self):
         """Return the next pair of photos to compare"""
-        if self.completed_matches >= self.total_matches:
+        if self.is_complete():
             return None, None
         
-        # Select photos, prioritizing those with fewer comparisons
-        photos = list(self.photo_files)
+        # Taken from the pairs reserved by peek_next_matchups, if any
+        idx1, idx2 = self._next_reserved()
         
-        # Weight selection by inverse of comparison count
-        weights = [1.0 / (1 + self.comparisons[p]) for p in photos]
-        total_weight = sum(weights)
-        weights = [w / total_weight for w in weights]
-        
-        # Select first photo
-        photo1 = random.choices(photos, weights=weights, k=1)[0]
+        photo1 = self.photo_files[idx1]
+        photo2 = self.photo_files[idx2]
+        self.current_matchup = (photo1, photo2)
+        return self.current_matchup
+    
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming pairs, drawn now and reserved until they are shown"""
+        return self._reserve_matchups(k)
+    
+    def _draw_matchup(self):
+        """Pick a new pair of photo ids"""
+        # Select first photo, weighted by inverse of comparison count
+        idx1 = self.sampler.sample()
         
         # For second photo, select one with similar rating
         # This makes comparisons more informative
-        remaining = [p for p in photos if p != photo1]
-        photo1_rating = self.ratings[photo1]
-        
-        # Calculate "similarity" scores (closer ratings = higher score)
-        similarities = []
-        for p in remaining:
-            rating_diff = abs(self.ratings[p] - photo1_rating)
-            # Sigmoid-like function: photos with similar ratings get higher weights
-            similarity = 1.0 / (1 + rating_diff / 400.0)
-            similarities.append(similarity)
-        
-        # Normalize similarities
-        total_sim = sum(similarities)
-        if total_sim > 0:
-            similarities = [s / total_sim for s in similarities]
-            photo2 = random.choices(remaining, weights=similarities, k=1)[0]
-        else:
-            photo2 = random.choice(remaining)
+        candidates = self.rating_index.neighbors(idx1)
+        rating_diff = np.abs(self.ratings[candidates] - self.ratings[idx1])
+        # Sigmoid-like function: photos with similar ratings get higher weights
+        similarities = 1.0 / (1.0 + rating_diff / 400.0)
+        idx2 = int(candidates[weighted_index(similarities)])
         
-        self.current_matchup = (photo1, photo2)
-        return self.current_matchup
+        return idx1, idx2
     
     def update_ratings(self, winner, loser):
         """Update Elo ratings based on comparison result"""
@@ -71,34 +79,121 @@ class EloRating(BaseRating):
         if set(self.current_matchup) != set([winner, loser]):
             return
         
+        winner_idx = self.photo_to_index[winner]
+        loser_idx = self.photo_to_index[loser]
+        
         # Get current ratings
-        rating_winner = self.ratings[winner]
-        rating_loser = self.ratings[loser]
+        rating_winner = float(self.ratings[winner_idx])
+        rating_loser = float(self.ratings[loser_idx])
         
         # Calculate expected scores
         expected_winner = 1.0 / (1 + 10 ** ((rating_loser - rating_winner) / 400.0))
         expected_loser = 1.0 / (1 + 10 ** ((rating_winner - rating_loser) / 400.0))
         
         # Update ratings
-        self.ratings[winner] += self.K * (1 - expected_winner)
-        self.ratings[loser] += self.K * (0 - expected_loser)
+        self.ratings[winner_idx] = rating_winner + self.K * (1 - expected_winner)
+        self.ratings[loser_idx] = rating_loser + self.K * (0 - expected_loser)
+        self.rating_index.update(winner_idx, self.ratings[winner_idx])
+        self.rating_index.update(loser_idx, self.ratings[loser_idx])
         
         # Update comparison counts
-        self.comparisons[winner] += 1
-        self.comparisons[loser] += 1
+        self.comparisons[winner_idx] += 1
+        self.comparisons[loser_idx] += 1
+        self.sampler.update(winner_idx, 1.0 / (1 + int(self.comparisons[winner_idx])))
+        self.sampler.update(loser_idx, 1.0 / (1 + int(self.comparisons[loser_idx])))
         
         # Mark match as completed
         self.completed_matches += 1
+        self.convergence.observe(self)
+        self._release_reserved((winner_idx, loser_idx))
         self.current_matchup = None
     
-    def get_current_rankings(self):
-        """Return sorted list of (photo_path, score) tuples"""
-        return sorted(self.ratings.items(), key=lambda x: x[1], reverse=True)
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        keep = winners != losers
+        winners, losers = winners[keep], losers[keep]
+        self._release_reserved()
+        
+        # Applied in spans ending where convergence is checked, so the checks
+        # see the same ratings as when playing tap by tap
+        for start, stop in self.convergence.spans(len(winners)):
+            self._apply_results(winners[start:stop], losers[start:stop])
+            self.convergence.observe(self, stop - start)
+    
+    def _apply_results(self, winners, losers):
+        """Apply results given as arrays of winner and loser photo ids"""
+        # Elo depends on result order, so results are applied one by one,
+        # but on plain floats with the selection structures refreshed once
+        ratings = self.ratings.tolist()
+        K = self.K
+        for winner_idx, loser_idx in zip(winners.tolist(), losers.tolist()):
+            rating_winner = ratings[winner_idx]
+            rating_loser = ratings[loser_idx]
+            expected_winner = 1.0 / (1 + 10 ** ((rating_loser - rating_winner) / 400.0))
+            expected_loser = 1.0 / (1 + 10 ** ((rating_winner - rating_loser) / 400.0))
+            ratings[winner_idx] = rating_winner + K * (1 - expected_winner)
+            ratings[loser_idx] = rating_loser + K * (0 - expected_loser)
+        self.ratings[:] = ratings
+        
+        self.comparisons += np.bincount(winners, minlength=len(ratings)).astype(np.int32)
+        self.comparisons += np.bincount(losers, minlength=len(ratings)).astype(np.int32)
+        self.completed_matches += len(winners)
+        
+        touched = np.unique(np.concatenate([winners, losers]))
+        self.rating_index.update_many(touched.tolist(), self.ratings[touched].tolist())
+        self.sampler.rebuild(1.0 / (1.0 + self.comparisons))
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(K=self.K, total_matches=self.total_matches, completed_matches=self.completed_matches)
+        arrays.update(self.store.arrays)
+        
+        convergence_state, convergence_arrays = self.convergence.to_state()
+        state["convergence"] = convergence_state
+        arrays.update(convergence_arrays)
+        arrays["index_tiebreaks"] = self.rating_index.tiebreaks()
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        self.K = state["K"]
+        self.total_matches = state["total_matches"]
+        self.completed_matches = state["completed_matches"]
+        self.convergence.load_state(state["convergence"], arrays)
+        
+        self.store.load(arrays)
+        self.ratings = self.store["ratings"]
+        self.comparisons = self.store["comparisons"]
+        
+        # Selection structures are derived from the arrays
+        self.sampler.rebuild(1.0 / (1.0 + self.comparisons))
+        self.rating_index = RatingIndex(self.ratings, tiebreaks=arrays["index_tiebreaks"])
+        self.current_matchup = None
+    
+    def _ranking_scores(self):
+        """Return the array of per-id scores that rankings are sorted by"""
+        return self.ratings
+    
+    def _convergence_estimates(self):
+        """Return (scores, posterior means, posterior sds) for the convergence monitor"""
+        return self.ratings, None, None
+    
+    def get_top_rankings(self, k):
+        """Return the best k (photo_path, score) tuples, in the same order as get_current_rankings"""
+        # The score is the rating, so the rating index already has them in order
+        ids = self.rating_index.top(k)
+        if ids is None:
+            return super().get_top_rankings(k)
+        return [(self.photo_files[i], float(self.ratings[i])) for i in ids]
     
     def is_complete(self):
-        """Return True if all matches have been completed"""
-        return self.completed_matches >= self.total_matches
+        """Return True once the ranking has settled"""
+        return self.convergence.complete
     
     def estimated_matchups(self):
-        """Return total number of matchups"""
-        return self.total_matches
+        """Return the expected total number of matchups (revised as the ranking settles)"""
+        return self.convergence.estimated_taps()
@@ -1,11 +1,15 @@
 from rating_systems.base_rating import BaseRating
-import random
+from rating_systems.rating_store import RatingStore, weighted_index
+from rating_systems.weighted_sampler import WeightedSampler
+from rating_systems.rating_index import RatingIndex
+from rating_systems.convergence import ConvergenceMonitor
 import math
+import numpy as np
 
 class Glicko2Rating(BaseRating):
     """Glicko-2 rating system with rating deviation and volatility"""
     
-    def __init__(self, photo_files):
+    def __init__(self, photo_files, period_length=10, confidence=0.8):
         super().__init__(photo_files)
         self.name = "Glicko-2"
         
@@ -13,168 +17,357 @@ class Glicko2Rating(BaseRating):
         self.tau = 0.5  # System volatility (smaller = less volatility)
         self.default_rd = 350  # Default rating deviation
         self.default_volatility = 0.06  # Default volatility
+        self.min_rd = 30  # RDs never drop below this
+        self.epsilon = 0.000001  # Convergence tolerance of the volatility solve
         
-        # Initialize ratings, rating deviations (RD), and volatilities
-        self.ratings = {}
-        self.rds = {}
-        self.volatilities = {}
+        # Results are collected into rating periods of this many taps and
+        # then applied together, as Glicko-2 intends
+        self.period_length = period_length
+        self.period_winners = []
+        self.period_losers = []
         
-        for photo in photo_files:
-            self.ratings[photo] = 1500  # Initial rating
-            self.rds[photo] = self.default_rd  # Initial RD
-            self.volatilities[photo] = self.default_volatility  # Initial volatility
+        # Initialize ratings, rating deviations (RD), and volatilities
+        # as arrays indexed by photo id
+        self.store = RatingStore(len(self.photo_files))
+        self.ratings = self.store.add_array("ratings", 1500.0)  # Initial rating
+        self.rds = self.store.add_array("rds", float(self.default_rd))  # Initial RD
+        self.volatilities = self.store.add_array("volatilities", self.default_volatility)
         
         # Track number of comparisons
-        self.comparisons = {photo: 0 for photo in photo_files}
+        self.comparisons = self.store.add_array("comparisons", 0, dtype=np.int32)
+        
+        # First-photo sampler weighted by RD
+        self.sampler = WeightedSampler(self.rds)
+        
+        # Photos ordered by rating, for picking opponents near photo1
+        self.rating_index = RatingIndex(self.ratings)
         
-        # Total matches to perform (approximately 6 per photo)
+        # At most 6 matches per photo; the session ends earlier
+        # once the rating deviations put the order at the requested
+        # confidence, or the order stops changing
         self.total_matches = len(photo_files) * 6
         self.completed_matches = 0
+        self.convergence = ConvergenceMonitor(len(self.photo_files), self.total_matches, confidence=confidence)
         
         # Current matchup
         self.current_matchup = None
     
     def get_next_matchup(self):
         """Return the next pair of photos to compare"""
-        if self.completed_matches >= self.total_matches:
+        if self.is_complete():
             return None, None
         
-        # Select photos, prioritizing those with higher RD (uncertainty)
-        photos = list(self.photo_files)
+        # Taken from the pairs reserved by peek_next_matchups, if any
+        idx1, idx2 = self._next_reserved()
         
-        # Weight selection by RD
-        weights = [self.rds[p] for p in photos]
-        total_weight = sum(weights)
-        weights = [w / total_weight for w in weights]
-        
-        # Select first photo
-        photo1 = random.choices(photos, weights=weights, k=1)[0]
+        photo1 = self.photo_files[idx1]
+        photo2 = self.photo_files[idx2]
+        self.current_matchup = (photo1, photo2)
+        return self.current_matchup
+    
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming pairs, drawn now and reserved until they are shown"""
+        return self._reserve_matchups(k)
+    
+    def _draw_matchup(self):
+        """Pick a new pair of photo ids"""
+        # Select first photo, prioritizing those with higher RD (uncertainty)
+        idx1 = self.sampler.sample()
         
         # For second photo, select one with similar rating but high RD
-        remaining = [p for p in photos if p != photo1]
-        photo1_rating = self.ratings[photo1]
-        
-        # Calculate combined weights based on rating similarity and RD
-        combined_weights = []
-        for p in remaining:
-            rating_diff = abs(self.ratings[p] - photo1_rating)
-            # Rating similarity factor (closer = higher weight)
-            similarity = 1.0 / (1 + rating_diff / 400.0)
-            # RD factor (higher RD = higher weight)
-            rd_factor = self.rds[p] / self.default_rd
-            # Combine factors
-            weight = similarity * rd_factor
-            combined_weights.append(weight)
-        
-        # Normalize weights
-        total_weight = sum(combined_weights)
-        if total_weight > 0:
-            combined_weights = [w / total_weight for w in combined_weights]
-            photo2 = random.choices(remaining, weights=combined_weights, k=1)[0]
-        else:
-            photo2 = random.choice(remaining)
+        candidates = self.rating_index.neighbors(idx1)
+        rating_diff = np.abs(self.ratings[candidates] - self.ratings[idx1])
+        # Rating similarity factor (closer = higher weight)
+        similarity = 1.0 / (1.0 + rating_diff / 400.0)
+        # RD factor (higher RD = higher weight)
+        rd_factor = self.rds[candidates] / self.default_rd
+        # Combine factors
+        combined_weights = similarity * rd_factor
+        idx2 = int(candidates[weighted_index(combined_weights)])
         
-        self.current_matchup = (photo1, photo2)
-        return self.current_matchup
+        return idx1, idx2
     
     def update_ratings(self, winner, loser):
-        """Update Glicko-2 ratings based on comparison result"""
+        """Record a comparison result in the current rating period"""
         # Verify this is the current pair
         if set(self.current_matchup) != set([winner, loser]):
             return
         
-        # Convert ratings and RDs to Glicko-2 scale
-        winner_rating = (self.ratings[winner] - 1500) / 173.7178
-        winner_rd = self.rds[winner] / 173.7178
+        winner_idx = self.photo_to_index[winner]
+        loser_idx = self.photo_to_index[loser]
         
-        loser_rating = (self.ratings[loser] - 1500) / 173.7178
-        loser_rd = self.rds[loser] / 173.7178
+        # O(1) per tap: the heavy lifting happens once per rating period
+        self.period_winners.append(winner_idx)
+        self.period_losers.append(loser_idx)
         
-        # Compute g(RD)
-        g_loser = 1 / math.sqrt(1 + 3 * loser_rd**2 / math.pi**2)
-        g_winner = 1 / math.sqrt(1 + 3 * winner_rd**2 / math.pi**2)
+        # Update comparison counts
+        self.comparisons[winner_idx] += 1
+        self.comparisons[loser_idx] += 1
+        self.completed_matches += 1
         
-        # Compute E (expected outcome)
-        E_winner = 1 / (1 + math.exp(-g_loser * (winner_rating - loser_rating)))
-        E_loser = 1 / (1 + math.exp(-g_winner * (loser_rating - winner_rating)))
+        if len(self.period_winners) >= self.period_length:
+            self._close_rating_period()
+        self._observe(1)
+        self._release_reserved((winner_idx, loser_idx))
         
-        # Compute v (variance)
-        v_winner = 1 / (g_loser**2 * E_winner * (1 - E_winner))
-        v_loser = 1 / (g_winner**2 * E_loser * (1 - E_loser))
+        # Reset current matchup
+        self.current_matchup = None
+    
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        keep = winners != losers
+        winners, losers = winners[keep], losers[keep]
+        self._release_reserved()
         
-        # Compute delta (expected rating change)
-        delta_winner = v_winner * g_loser * (1 - E_winner)
-        delta_loser = v_loser * g_winner * (0 - E_loser)
+        # Applied in spans ending where convergence is checked, so the checks
+        # see the same ratings as when playing tap by tap
+        for start, stop in self.convergence.spans(len(winners)):
+            self._apply_results(winners[start:stop], losers[start:stop])
+            self._observe(stop - start)
+    
+    def _observe(self, taps):
+        """Count taps towards convergence, applying the open period when the session finishes"""
+        was_complete = self.convergence.complete
+        self.convergence.observe(self, taps)
+        if self.convergence.complete and not was_complete:
+            self._close_rating_period()
+    
+    def _apply_results(self, winners, losers):
+        """Apply results given as arrays of winner and loser photo ids"""
+        # Results go through the same rating periods as single taps, so a
+        # batch leaves exactly the state the taps one by one would have.
+        # First top up the open period
+        start = min(self.period_length - len(self.period_winners), len(winners))
+        self.period_winners.extend(winners[:start].tolist())
+        self.period_losers.extend(losers[:start].tolist())
+        if len(self.period_winners) >= self.period_length:
+            self._close_rating_period()
         
-        # Update volatilities
-        self.volatilities[winner] = self._update_volatility(
-            winner_rating, winner_rd, delta_winner, v_winner, self.volatilities[winner]
-        )
-        self.volatilities[loser] = self._update_volatility(
-            loser_rating, loser_rd, delta_loser, v_loser, self.volatilities[loser]
-        )
+        # Then the whole periods in the batch, and the rest opens a new period
+        whole = (len(winners) - start) // self.period_length
+        end = start + whole * self.period_length
+        self._apply_periods(winners[start:end].reshape(whole, self.period_length),
+                            losers[start:end].reshape(whole, self.period_length))
+        self.period_winners.extend(winners[end:].tolist())
+        self.period_losers.extend(losers[end:].tolist())
         
-        # Update RDs
-        new_rd_winner = math.sqrt(winner_rd**2 + self.volatilities[winner]**2)
-        new_rd_loser = math.sqrt(loser_rd**2 + self.volatilities[loser]**2)
+        # Refresh the selection structures once for the whole batch
+        touched = np.unique(np.concatenate([winners, losers]))
+        self.rating_index.update_many(touched.tolist(), self.ratings[touched].tolist())
+        self.sampler.rebuild(self.rds)
         
-        self.rds[winner] = 1 / math.sqrt(1/new_rd_winner**2 + 1/v_winner) * 173.7178
-        self.rds[loser] = 1 / math.sqrt(1/new_rd_loser**2 + 1/v_loser) * 173.7178
+        self.comparisons += np.bincount(winners, minlength=self.store.size).astype(np.int32)
+        self.comparisons += np.bincount(losers, minlength=self.store.size).astype(np.int32)
+        self.completed_matches += len(winners)
+    
+    def _apply_periods(self, winners, losers):
+        """Apply consecutive rating periods (one per row), several at a time
         
-        # Ensure RDs don't go below a minimum threshold
-        min_rd = 30
-        self.rds[winner] = max(self.rds[winner], min_rd)
-        self.rds[loser] = max(self.rds[loser], min_rd)
+        Periods that share no photo don't affect each other, so each period
+        is put in the wave after the last wave that used any of its photos
+        and every wave is applied as a single step. Each photo still sees
+        its periods in order, so the result is the same as one by one.
+        """
+        wave_of_photo = {}
+        waves = []
+        for period, photos in enumerate(np.concatenate([winners, losers], axis=1).tolist()):
+            wave = 1 + max(wave_of_photo.get(photo, -1) for photo in photos)
+            for photo in photos:
+                wave_of_photo[photo] = wave
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(period)
         
-        # Update ratings
-        self.ratings[winner] += g_loser * (1 - E_winner) * new_rd_winner**2 * 173.7178
-        self.ratings[loser] += g_winner * (0 - E_loser) * new_rd_loser**2 * 173.7178
+        for periods in waves:
+            self._apply_period(winners[periods].ravel(), losers[periods].ravel(), refresh=False)
+    
+    def _close_rating_period(self):
+        """Apply all results of the rating period as one vectorized Glicko-2 step"""
+        if not self.period_winners:
+            return
         
-        # Update comparison counts
-        self.comparisons[winner] += 1
-        self.comparisons[loser] += 1
-        self.completed_matches += 1
+        winners = np.array(self.period_winners, dtype=np.int64)
+        losers = np.array(self.period_losers, dtype=np.int64)
+        self.period_winners = []
+        self.period_losers = []
+        self._apply_period(winners, losers)
+        self._release_reserved(set(winners.tolist() + losers.tolist()))
+    
+    def _apply_period(self, winners, losers, refresh=True):
+        """Glicko-2 steps 2-8 for one rating period, over the photos that played only"""
+        played, ratings, rds, volatilities = self._period_step(winners, losers)
+        self.volatilities[played] = volatilities
+        self.ratings[played] = ratings
+        self.rds[played] = rds
         
-        # Reset current matchup
+        # Refresh selection structures for the photos that changed
+        if not refresh:
+            return
+        for i in played.tolist():
+            self.sampler.update(i, float(self.rds[i]))
+            self.rating_index.update(i, self.ratings[i])
+    
+    def _period_step(self, winners, losers):
+        """Return (photo ids, new ratings, new RDs, new volatilities) after one rating period
+        
+        Nothing is stored, so this also gives a provisional view of an open period.
+        """
+        # Every game counts once for each side
+        players = np.concatenate([winners, losers])
+        opponents = np.concatenate([losers, winners])
+        scores = np.concatenate([np.ones(len(winners)), np.zeros(len(losers))])
+        
+        # Work in a compact index space of the photos that played, so a
+        # period costs O(games) no matter how large the collection is
+        played, slot = np.unique(players, return_inverse=True)
+        
+        # Step 2: convert to the Glicko-2 scale
+        mu = (self.ratings[played] - 1500) / 173.7178
+        phi = self.rds[played] / 173.7178
+        mu_opponents = (self.ratings[opponents] - 1500) / 173.7178
+        phi_opponents = self.rds[opponents] / 173.7178
+        
+        # Steps 3-4: estimated variance v and improvement delta per player
+        g = 1 / np.sqrt(1 + 3 * phi_opponents**2 / math.pi**2)
+        E = 1 / (1 + np.exp(-g * (mu[slot] - mu_opponents)))
+        v_inv = np.bincount(slot, weights=g**2 * E * (1 - E), minlength=len(played))
+        score_sum = np.bincount(slot, weights=g * (scores - E), minlength=len(played))
+        
+        informative = v_inv > 0
+        played = played[informative]
+        mu, phi = mu[informative], phi[informative]
+        score_sum = score_sum[informative]
+        v = 1 / v_inv[informative]
+        delta = v * score_sum
+        
+        # Step 5: new volatilities
+        sigma = self._solve_volatility(delta, phi, v, self.volatilities[played])
+        
+        # Steps 6-7: new RD and rating for photos that played. Photos that
+        # did not play keep their RD: a photo does not change between taps,
+        # so the inactivity growth of RD would only erase what was learned
+        phi_star_sq = phi**2 + sigma**2
+        new_phi = 1 / np.sqrt(1 / phi_star_sq + 1 / v)
+        new_mu = mu + new_phi**2 * score_sum
+        
+        # Step 8: back to the original scale
+        return played, 173.7178 * new_mu + 1500, np.maximum(173.7178 * new_phi, self.min_rd), sigma
+    
+    def _solve_volatility(self, delta, phi, v, sigma):
+        """Glicko-2 step 5: Illinois iteration for the new volatility (vectorized)"""
+        a = np.log(sigma**2)
+        tau_sq = self.tau**2
+        
+        def f(x):
+            ex = np.exp(x)
+            return (ex * (delta**2 - phi**2 - v - ex) / (2 * (phi**2 + v + ex)**2)
+                    - (x - a) / tau_sq)
+        
+        # Bracket the root
+        A = a.copy()
+        big_change = delta**2 > phi**2 + v
+        B = np.where(big_change, np.log(np.maximum(delta**2 - phi**2 - v, 1e-300)), a - self.tau)
+        k = np.ones(len(a))
+        needs_step = ~big_change & (f(B) < 0)
+        while needs_step.any():
+            k[needs_step] += 1
+            B = np.where(needs_step, a - k * self.tau, B)
+            needs_step &= f(B) < 0
+        
+        fA = f(A)
+        fB = f(B)
+        active = np.abs(B - A) > self.epsilon
+        for _ in range(100):
+            if not active.any():
+                break
+            C = A + (A - B) * fA / (fB - fA)
+            fC = f(C)
+            side = fC * fB <= 0
+            A = np.where(active & side, B, A)
+            fA = np.where(active & side, fB, np.where(active, fA / 2, fA))
+            B = np.where(active, C, B)
+            fB = np.where(active, fC, fB)
+            active &= np.abs(B - A) > self.epsilon
+        
+        return np.exp(A / 2)
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(
+            tau=self.tau, default_rd=self.default_rd, default_volatility=self.default_volatility,
+            min_rd=self.min_rd, epsilon=self.epsilon, period_length=self.period_length,
+            total_matches=self.total_matches, completed_matches=self.completed_matches,
+        )
+        arrays.update(self.store.arrays)
+        
+        convergence_state, convergence_arrays = self.convergence.to_state()
+        state["convergence"] = convergence_state
+        arrays.update(convergence_arrays)
+        
+        # The open rating period is kept as is, not closed early
+        arrays["period_winners"] = np.array(self.period_winners, dtype=np.int64)
+        arrays["period_losers"] = np.array(self.period_losers, dtype=np.int64)
+        arrays["index_tiebreaks"] = self.rating_index.tiebreaks()
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        for name in ("tau", "default_rd", "default_volatility", "min_rd", "epsilon",
+                     "period_length", "total_matches", "completed_matches"):
+            setattr(self, name, state[name])
+        self.convergence.load_state(state["convergence"], arrays)
+        
+        self.store.load(arrays)
+        self.ratings = self.store["ratings"]
+        self.rds = self.store["rds"]
+        self.volatilities = self.store["volatilities"]
+        self.comparisons = self.store["comparisons"]
+        self.period_winners = arrays["period_winners"].tolist()
+        self.period_losers = arrays["period_losers"].tolist()
+        
+        # Selection structures are derived from the arrays
+        self.sampler.rebuild(self.rds)
+        self.rating_index = RatingIndex(self.ratings, tiebreaks=arrays["index_tiebreaks"])
         self.current_matchup = None
     
-    def _update_volatility(self, rating, rd, delta, v, sigma):
-        """Update volatility using iterative algorithm"""
-        # Simplified volatility update
-        # In a full implementation, this would use the iterative algorithm
-        # from the Glicko-2 paper, but we use a simpler approach here
-        delta_sq = delta**2
-        rd_sq = rd**2
-        
-        # If the outcome was expected (delta is small), reduce volatility
-        # If the outcome was unexpected (delta is large), increase volatility
-        if delta_sq > rd_sq + v:
-            # Unexpected result - increase volatility
-            return min(sigma * 1.1, 0.1)
-        else:
-            # Expected result - decrease volatility slightly
-            return max(sigma * 0.9, 0.05)
-    
-    def get_current_rankings(self):
-        """Return sorted list of (photo_path, score) tuples"""
+    def _ranking_scores(self):
+        """Return the array of per-id scores that rankings are sorted by"""
+        if not self.period_winners:
+            return self._adjusted_scores(self.ratings, self.rds)
+        
+        # Include results still waiting in the open rating period, on copies:
+        # closing the period early would change the ratings
+        played, ratings, rds, _ = self._period_step(np.array(self.period_winners, dtype=np.int64),
+                                                    np.array(self.period_losers, dtype=np.int64))
+        provisional_ratings = self.ratings.copy()
+        provisional_rds = self.rds.copy()
+        provisional_ratings[played] = ratings
+        provisional_rds[played] = rds
+        return self._adjusted_scores(provisional_ratings, provisional_rds)
+    
+    def _convergence_estimates(self):
+        """Return (scores, posterior means, posterior sds) for the convergence monitor"""
+        # Read as they are, without the open period
+        return self._adjusted_scores(self.ratings, self.rds), self.ratings, self.rds
+    
+    def _adjusted_scores(self, ratings, rds):
+        """Return the confidence-adjusted score of every photo"""
         # Convert ratings to confidence-adjusted scores
         # Lower RD means more confidence in the rating
-        scores = []
-        for photo in self.photo_files:
-            # Confidence factor: reduces score if RD is high
-            confidence = 1 - (self.rds[photo] / (self.default_rd * 2))
-            confidence = max(0.5, min(1.0, confidence))
-            
-            # Adjusted score combines rating and confidence
-            adjusted_score = self.ratings[photo] * confidence
-            scores.append((photo, adjusted_score))
-        
-        return sorted(scores, key=lambda x: x[1], reverse=True)
+        # Confidence factor: reduces score if RD is high
+        confidence = np.clip(1 - rds / (self.default_rd * 2), 0.5, 1.0)
+        
+        # Adjusted score combines rating and confidence
+        return ratings * confidence
     
     def is_complete(self):
-        """Return True if all scheduled matches have been completed"""
-        return self.completed_matches >= self.total_matches
+        """Return True once the ranking has settled"""
+        return self.convergence.complete
     
     def estimated_matchups(self):
-        """Return total number of matchups"""
-        return self.total_matches
+        """Return the expected total number of matchups (revised as the ranking settles)"""
+        return self.convergence.estimated_taps()
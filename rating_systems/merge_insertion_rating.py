@@ -0,0 +1,200 @@
+from rating_systems.stepwise_rating import StepwiseRating
+from rating_systems.cost_models import merge_insertion_comparisons
+import heapq
+import random
+
+class ChainPositions:
+    """Chain positions of the main items during one group of insertions
+    
+    When a group starts, everything below main[done] is already in the
+    chain, so main[i] (i >= done) is at index i + done. It then moves up
+    once for every item of the group inserted below it. An item inserted
+    below main[m] is below every later main item too, so a Fenwick tree
+    over main indices counts those in O(log n) instead of a chain search.
+    """
+    
+    def __init__(self, size, done):
+        self.done = done
+        self.size = size - done
+        self.tree = [0] * (self.size + 1)
+    
+    def add_below(self, m):
+        """Count an item inserted below main[m] (nothing if m is past the end)"""
+        i = max(m, self.done) - self.done + 1
+        tree = self.tree
+        while i <= self.size:
+            tree[i] += 1
+            i += i & -i
+    
+    def position(self, m):
+        """Return the index of main[m] in the chain (m >= done)"""
+        count = 0
+        i = m - self.done + 1
+        tree = self.tree
+        while i > 0:
+            count += tree[i]
+            i -= i & -i
+        return m + self.done + count
+
+class MergeInsertionRating(StepwiseRating):
+    """Ford-Johnson merge-insertion sort, using close to the minimum number of comparisons"""
+    
+    def __init__(self, photo_files):
+        super().__init__(photo_files)
+        self.name = "Merge Insertion"
+        
+        # Randomize order initially, as Quick Sort does
+        self.n = len(self.photo_files)
+        self.initial_order = list(range(self.n))
+        random.shuffle(self.initial_order)
+        
+        # Final order, best photo first (set when sorting finishes)
+        self.ranking = None
+        
+        self.est_matchups = self.worst_case_comparisons(self.n)
+        self._start()
+    
+    # Ford-Johnson worst case: sum of ceil(log2(3k/4)) for k = 1..n
+    worst_case_comparisons = staticmethod(merge_insertion_comparisons)
+    
+    def _run(self):
+        """Sort all photos, then store the ranking best-first"""
+        chain = yield from self._merge_insertion(self.initial_order)
+        self.ranking = chain[::-1]
+    
+    def _merge_insertion(self, items):
+        """Sort ids from least to most preferred with Ford-Johnson merge insertion"""
+        n = len(items)
+        if n < 2:
+            return list(items)
+        
+        # 1. Compare items in pairs, remembering each winner's partner
+        larger = []
+        partner = {}
+        for k in range(0, n - 1, 2):
+            a, b = items[k], items[k + 1]
+            # The next pair of this round doesn't depend on the result
+            self.following = [(items[k + 2], items[k + 3])] if k + 3 < n else []
+            a_wins = yield (a, b)
+            winner, loser = (a, b) if a_wins else (b, a)
+            larger.append(winner)
+            partner[winner] = loser
+        
+        # 2. Recursively sort the winners
+        main = yield from self._merge_insertion(larger)
+        
+        # 3. The partner of the smallest winner is below it, so it goes first for free
+        pend = [partner[a] for a in main]
+        chain = [pend[0]] + main
+        if n % 2:
+            pend.append(items[-1])  # Unpaired item has no known upper bound
+        
+        # 4. Binary-insert the rest in Jacobsthal-sized groups (1, 3, 5, 11, 21, ...),
+        # each group from its highest index down, so every search covers at
+        # most 2^k - 1 elements. above maps every item in the chain to the
+        # index in main of the first main item above it (itself for main
+        # items), which locates the main items without searching the chain
+        above = {a: i for i, a in enumerate(main)}
+        above[pend[0]] = 0
+        done = 1
+        k = 2
+        while done < len(pend):
+            group_end = min((2 ** (k + 1) + (-1) ** k) // 3, len(pend))
+            positions = ChainPositions(len(main), done)
+            for i in range(group_end - 1, done - 1, -1):
+                item = pend[i]
+                
+                # Item inserted after this one (None if that is left to the caller)
+                if i - 1 >= done:
+                    next_i = i - 1
+                elif group_end < len(pend):
+                    next_i = min((2 ** (k + 2) + (-1) ** (k + 1)) // 3, len(pend)) - 1
+                else:
+                    next_i = None
+                
+                # Only the part of the chain below the item's partner needs searching
+                lo = 0
+                hi = positions.position(i) if i < len(main) else len(chain)
+                
+                # Same limit for the next item, in the chain as it is now (the
+                # next group starts with main[next_i] at next_i + group_end)
+                if next_i is None or next_i >= len(main):
+                    next_limit = len(chain)
+                elif next_i == i - 1:
+                    next_limit = positions.position(next_i)
+                else:
+                    next_limit = next_i + group_end - 1
+                
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    
+                    # For each result: the next probe of this search, or the
+                    # first probe for the next item once this search ends
+                    self.following = []
+                    for next_lo, next_hi in ((mid + 1, hi), (lo, mid)):
+                        if next_lo < next_hi:
+                            self.following.append((item, chain[(next_lo + next_hi) // 2]))
+                        elif next_i is not None:
+                            self.following += self._first_probe(chain, pend[next_i], next_limit, item, next_lo)
+                    
+                    item_wins = yield (item, chain[mid])
+                    if item_wins:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                above[item] = above[chain[lo]] if lo < len(chain) else len(main)
+                positions.add_below(above[item])
+                chain.insert(lo, item)
+            done = group_end
+            k += 1
+        
+        return chain
+    
+    def _first_probe(self, chain, item, hi, inserted, position):
+        """Return [the first comparison for item] once inserted goes in at position of chain
+        
+        hi is the end of the item's search range in the chain without inserted.
+        """
+        hi += position <= hi
+        if hi == 0:
+            return []
+        
+        mid = hi // 2
+        if mid < position:
+            return [(item, chain[mid])]
+        if mid == position:
+            return [(item, inserted)]
+        return [(item, chain[mid - 1])]
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        # Set again when the replayed sort finishes
+        self.ranking = None
+        super()._restore_state(state, arrays)
+    
+    def get_current_rankings(self):
+        """Return sorted list of (photo_path, score) tuples"""
+        return self._ranked(self.n)
+    
+    def get_top_rankings(self, k):
+        """Return the best k (photo_path, score) tuples, in the same order as get_current_rankings"""
+        return self._ranked(k)
+    
+    def iter_rankings(self):
+        """Yield (photo_path, score) tuples best first"""
+        yield from self._ranked(self.n)
+    
+    def _ranked(self, k):
+        """Return the first k entries of the rankings"""
+        if self.ranking is not None:
+            # Final order: score is the position (higher position = higher rank)
+            return [(self.photo_files[i], self.n - r) for r, i in enumerate(self.ranking[:k])]
+        
+        # Still sorting: provisional order by wins so far (heap selection
+        # gives the same result as sorting everything and slicing)
+        order = heapq.nlargest(k, range(self.n), key=self.wins.__getitem__)
+        return [(self.photo_files[i], self.wins[i]) for i in order]
+    
+    def estimated_matchups(self):
+        """Return an estimate of the total number of matchups needed"""
+        return self.est_matchups
@@ -0,0 +1,179 @@
+import numpy as np
+
+class PairCounts:
+    """Sparse win counts for photo pairs, stored as growable COO arrays"""
+    
+    def __init__(self, n, capacity=None):
+        # Number of photos
+        self.n = n
+        
+        # Hashed pair table: (low_id * n + high_id) -> slot in the arrays below
+        self.slot_of = {}
+        
+        # One slot per observed pair (low_id < high_id)
+        capacity = capacity or max(16, n)
+        self.pair_low = np.zeros(capacity, dtype=np.int32)
+        self.pair_high = np.zeros(capacity, dtype=np.int32)
+        self.low_wins = np.zeros(capacity, dtype=np.int32)  # times low_id beat high_id
+        self.high_wins = np.zeros(capacity, dtype=np.int32)  # times high_id beat low_id
+        self.num_pairs = 0
+        
+        # Per-photo adjacency: id -> {opponent_id: times compared}
+        self.adjacency = {}
+        
+        # Running per-photo aggregates
+        self.win_totals = np.zeros(n, dtype=np.int64)
+        self.comparisons = np.zeros(n, dtype=np.int64)
+        self.total = 0
+    
+    def _grow(self):
+        """Double the capacity of the pair arrays"""
+        capacity = max(16, len(self.pair_low) * 2)
+        for name in ("pair_low", "pair_high", "low_wins", "high_wins"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.num_pairs] = old[:self.num_pairs]
+            setattr(self, name, new)
+    
+    def add(self, winner, loser):
+        """Record that photo id winner beat photo id loser"""
+        low, high = (winner, loser) if winner < loser else (loser, winner)
+        key = low * self.n + high
+        
+        slot = self.slot_of.get(key)
+        if slot is None:
+            # First comparison of this pair - allocate a slot
+            if self.num_pairs == len(self.pair_low):
+                self._grow()
+            slot = self.num_pairs
+            self.slot_of[key] = slot
+            self.pair_low[slot] = low
+            self.pair_high[slot] = high
+            self.num_pairs += 1
+        
+        if winner == low:
+            self.low_wins[slot] += 1
+        else:
+            self.high_wins[slot] += 1
+        
+        # Update adjacency of both photos
+        winner_adj = self.adjacency.setdefault(winner, {})
+        winner_adj[loser] = winner_adj.get(loser, 0) + 1
+        loser_adj = self.adjacency.setdefault(loser, {})
+        loser_adj[winner] = loser_adj.get(winner, 0) + 1
+        
+        # Update running aggregates
+        self.win_totals[winner] += 1
+        self.comparisons[winner] += 1
+        self.comparisons[loser] += 1
+        self.total += 1
+    
+    def add_many(self, winners, losers):
+        """Record a batch of results given as arrays of winner and loser ids"""
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        if len(winners) == 0:
+            return
+        
+        # Collapse the batch to one row per distinct pair
+        low = np.minimum(winners, losers)
+        high = np.maximum(winners, losers)
+        keys, inverse = np.unique(low * self.n + high, return_inverse=True)
+        low_won = (winners == low).astype(np.float64)
+        new_low_wins = np.bincount(inverse, weights=low_won, minlength=len(keys)).astype(np.int64)
+        new_totals = np.bincount(inverse, minlength=len(keys))
+        new_high_wins = new_totals - new_low_wins
+        
+        # Look up or allocate slots, and update adjacency, once per distinct pair
+        slots = np.empty(len(keys), dtype=np.int64)
+        for k, (key, count) in enumerate(zip(keys.tolist(), new_totals.tolist())):
+            i, j = divmod(key, self.n)
+            slot = self.slot_of.get(key)
+            if slot is None:
+                if self.num_pairs == len(self.pair_low):
+                    self._grow()
+                slot = self.num_pairs
+                self.slot_of[key] = slot
+                self.pair_low[slot] = i
+                self.pair_high[slot] = j
+                self.num_pairs += 1
+            slots[k] = slot
+            
+            i_adj = self.adjacency.setdefault(i, {})
+            i_adj[j] = i_adj.get(j, 0) + count
+            j_adj = self.adjacency.setdefault(j, {})
+            j_adj[i] = j_adj.get(i, 0) + count
+        
+        # Slots are distinct, so plain fancy-index addition is safe
+        self.low_wins[slots] += new_low_wins.astype(np.int32)
+        self.high_wins[slots] += new_high_wins.astype(np.int32)
+        
+        # Update running aggregates in place (other objects hold these arrays)
+        self.win_totals += np.bincount(winners, minlength=self.n)
+        self.comparisons += np.bincount(winners, minlength=self.n)
+        self.comparisons += np.bincount(losers, minlength=self.n)
+        self.total += len(winners)
+    
+    def to_arrays(self):
+        """Return the table as a dict of arrays (observed pairs only)"""
+        low, high, low_wins, high_wins = self.active()
+        return {
+            "pair_low": low,
+            "pair_high": high,
+            "low_wins": low_wins,
+            "high_wins": high_wins,
+            "win_totals": self.win_totals,
+            "comparisons": self.comparisons,
+        }
+    
+    def load(self, arrays):
+        """Replace the table with arrays returned by to_arrays (used as is, not copied)"""
+        for name in ("pair_low", "pair_high", "low_wins", "high_wins"):
+            setattr(self, name, arrays[name])
+        self.num_pairs = len(self.pair_low)
+        self.win_totals = arrays["win_totals"]
+        self.comparisons = arrays["comparisons"]
+        self.total = int(self.win_totals.sum())
+        
+        # Rebuild the hashed pair table and the adjacency
+        low = self.pair_low.astype(np.int64)
+        high = self.pair_high.astype(np.int64)
+        self.slot_of = dict(zip((low * self.n + high).tolist(), range(self.num_pairs)))
+        
+        # Both directions of every pair, grouped by photo, one dict per photo.
+        # Within a photo opponents keep slot order, which is the order they
+        # were first met in, as when the table was filled result by result
+        counts = (self.low_wins + self.high_wins).astype(np.int64)
+        photos = np.concatenate([low, high])
+        slots = np.tile(np.arange(self.num_pairs), 2)
+        order = np.lexsort((slots, photos))
+        photos = photos[order]
+        opponents = np.concatenate([high, low])[order].tolist()
+        counts = np.concatenate([counts, counts])[order].tolist()
+        starts = np.flatnonzero(np.diff(photos, prepend=-1)).tolist()
+        ends = starts[1:] + [len(photos)]
+        self.adjacency = {
+            photo: dict(zip(opponents[start:end], counts[start:end]))
+            for photo, start, end in zip(photos[starts].tolist(), starts, ends)
+        }
+    
+    def wins(self, i, j):
+        """Return the number of times photo id i beat photo id j"""
+        low, high = (i, j) if i < j else (j, i)
+        slot = self.slot_of.get(low * self.n + high)
+        if slot is None:
+            return 0
+        return int(self.low_wins[slot] if i == low else self.high_wins[slot])
+    
+    def count(self, i, j):
+        """Return the number of times photo ids i and j have been compared"""
+        low, high = (i, j) if i < j else (j, i)
+        slot = self.slot_of.get(low * self.n + high)
+        if slot is None:
+            return 0
+        return int(self.low_wins[slot] + self.high_wins[slot])
+    
+    def active(self):
+        """Return (low, high, low_wins, high_wins) views over the observed pairs"""
+        k = self.num_pairs
+        return self.pair_low[:k], self.pair_high[:k], self.low_wins[:k], self.high_wins[:k]
@@ -1,5 +1,8 @@
 from rating_systems.base_rating import BaseRating
+import itertools
 import random
+import numpy as np
+from rating_systems.cost_models import quicksort_comparisons
 
 class QuickSortRating(BaseRating):
     """Rating system using quicksort algorithm for efficiency"""
@@ -25,7 +28,7 @@ class QuickSortRating(BaseRating):
         
         # For estimating total matchups
         self.n = len(photo_files)
-        self.est_matchups = int(self.n * (self.n.bit_length() - 1)) if self.n > 1 else 0
+        self.est_matchups = quicksort_comparisons(self.n)
         self.completed_sorts = 0
     
     def get_next_matchup(self):
@@ -54,11 +57,56 @@ class QuickSortRating(BaseRating):
         # This shouldn't happen unless is_complete() is not checked properly
         return None, None
     
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming pairs: the rest of the partition being worked on
+        
+        Results only swap entries at or before the current position, so the
+        photos still to be compared with the pivot are known in advance. The
+        partitions after it depend on where the pivot lands, so peeking stops
+        at the end of the partition.
+        """
+        if self.current_partition is not None:
+            left, right = self.current_partition
+            j = self.current_j
+        elif self.stack:
+            left, right = self.stack[-1]
+            j = left + 1
+        else:
+            return []
+        
+        # The pivot stays at the left end until the partition is finished
+        pivot_photo = self.photos_to_sort[left]
+        end = min(right + 1, j + max(0, k))
+        return [(pivot_photo, self.photos_to_sort[position]) for position in range(j, end)]
+    
     def update_ratings(self, winner, loser):
         """Update based on comparison result"""
         if self.current_partition is None:
             return
         
+        self._record_result(winner)
+        if self.known_outcomes:
+            self._resolve_known()
+    
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        # Partitioning decides what to compare, so results are kept until it asks
+        self._remember_outcomes(winners, losers)
+        self._resolve_known()
+    
+    def _resolve_known(self):
+        """Answer pending comparisons from stored bulk results while possible"""
+        while not self.is_complete():
+            photo1, photo2 = self.get_next_matchup()
+            if photo1 is None:
+                return
+            winner = self._take_known_outcome(self.photo_to_index[photo1], self.photo_to_index[photo2])
+            if winner is None:
+                return
+            self._record_result(self.photo_files[winner])
+    
+    def _record_result(self, winner):
+        """Apply the result of the current pivot comparison"""
         left, right = self.current_partition
         pivot_photo = self.photos_to_sort[self.current_pivot]
         
@@ -89,11 +137,46 @@ class QuickSortRating(BaseRating):
             # Reset current partition
             self.current_partition = None
     
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(
+            current_partition=self.current_partition, current_pivot=self.current_pivot,
+            current_i=self.current_i, current_j=self.current_j,
+            est_matchups=self.est_matchups, completed_sorts=self.completed_sorts,
+        )
+        arrays["order"] = np.array([self.photo_to_index[p] for p in self.photos_to_sort], dtype=np.int32)
+        arrays["stack"] = np.array(self.stack, dtype=np.int64).reshape(-1, 2)
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        self.photos_to_sort = [self.photo_files[i] for i in arrays["order"].tolist()]
+        self.stack = [tuple(entry) for entry in arrays["stack"].tolist()]
+        partition = state["current_partition"]
+        self.current_partition = tuple(partition) if partition is not None else None
+        self.current_pivot = state["current_pivot"]
+        self.current_i = state["current_i"]
+        self.current_j = state["current_j"]
+        self.est_matchups = state["est_matchups"]
+        self.completed_sorts = state["completed_sorts"]
+    
     def get_current_rankings(self):
         """Return sorted list of (photo_path, score) tuples"""
         # In QuickSort, the score is just the position (higher position = higher rank)
+        return list(self.iter_rankings())
+    
+    def get_top_rankings(self, k):
+        """Return the best k (photo_path, score) tuples, in the same order as get_current_rankings"""
+        return list(itertools.islice(self.iter_rankings(), k))
+    
+    def iter_rankings(self):
+        """Yield (photo_path, score) tuples best first"""
+        # The working list is the current order, so nothing needs sorting
         n = len(self.photos_to_sort)
-        return [(photo, n - i) for i, photo in enumerate(self.photos_to_sort)]
+        for i, photo in enumerate(self.photos_to_sort):
+            yield photo, n - i
     
     def is_complete(self):
         """Return True if the rating process is complete"""
@@ -0,0 +1,50 @@
+import numpy as np
+
+def ranking_ids(rankings, photo_to_index):
+    """Convert get_current_rankings() output into an array of photo ids, best first"""
+    return np.fromiter((photo_to_index[photo] for photo, _ in rankings), dtype=np.int64, count=len(rankings))
+
+def count_inversions(values):
+    """Count pairs i < j with values[i] > values[j] in O(n log n) (values: ints 0..n-1)"""
+    n = len(values)
+    tree = [0] * (n + 1)
+    inversions = 0
+    for seen, value in enumerate(values):
+        # Number of earlier values greater than this one
+        i = value + 1
+        smaller_or_equal = 0
+        while i > 0:
+            smaller_or_equal += tree[i]
+            i -= i & -i
+        inversions += seen - smaller_or_equal
+        
+        i = value + 1
+        while i <= n:
+            tree[i] += 1
+            i += i & -i
+    return inversions
+
+def kendall_tau(order, true_scores):
+    """Kendall tau between a best-first order of ids and the scores they should follow
+    
+    1.0 means the order sorts the photos exactly by true score, -1.0 means
+    exactly reversed. Scores are assumed distinct.
+    """
+    order = np.asarray(order)
+    n = len(order)
+    if n < 2:
+        return 1.0
+    
+    # True rank of each photo (0 = best), read in the predicted order
+    true_rank = np.empty(n, dtype=np.int64)
+    true_rank[np.argsort(-np.asarray(true_scores), kind="stable")] = np.arange(n)
+    inversions = count_inversions(true_rank[order].tolist())
+    return 1.0 - 4.0 * inversions / (n * (n - 1))
+
+def top_k_precision(order, true_scores, k):
+    """Fraction of the true best k photos found in the first k places of order"""
+    k = min(k, len(order))
+    if k <= 0:
+        return 1.0
+    true_top = np.argpartition(-np.asarray(true_scores), k - 1)[:k]
+    return len(np.intersect1d(np.asarray(order)[:k], true_top)) / k
@@ -1,26 +1,129 @@
-from rating_systems.quicksort_rating import QuickSortRating
-from rating_systems.simple_rating import SimpleRating
-from rating_systems.elo_rating import EloRating
-from rating_systems.bradley_terry_rating import BradleyTerryRating
-from rating_systems.glicko2_rating import Glicko2Rating
-from rating_systems.trueskill_rating import TrueSkillRating
+import importlib
+from rating_systems.cost_models import (all_pairs_comparisons, merge_insertion_comparisons, per_photo,
+                                        quicksort_comparisons, top_k_comparisons)
 
 class RatingFactory:
-    @staticmethod
-    def create_rating_system(system_name, photo_files):
-        """Create the appropriate rating system based on name"""
-        if system_name == "Quick Sort":
-            return QuickSortRating(photo_files)
-        elif system_name == "Simple":
-            return SimpleRating(photo_files)
-        elif system_name == "Elo":
-            return EloRating(photo_files)
-        elif system_name == "Bradley-Terry":
-            return BradleyTerryRating(photo_files)
-        elif system_name == "Glicko-2":
-            return Glicko2Rating(photo_files)
-        elif system_name == "TrueSkill":
-            return TrueSkillRating(photo_files)
-        else:
-            # Default to Quick Sort if unknown
-            return QuickSortRating(photo_files)
+    """Registry of rating systems, importing each engine only when it is created
+    
+    Listing the systems with their descriptions and cost models (e.g. to
+    fill the home screen) loads no engine code and no NumPy.
+    """
+    
+    # Names accepted by create_rating_system, in registration order
+    system_names = []
+    
+    # name -> dict of module, class_name, short, long, cost, options, adaptive
+    systems = {}
+    
+    @classmethod
+    def register(cls, name, module, class_name, short="", long="", cost=None, options=None, adaptive=False):
+        """Add a rating system
+        
+        module and class_name locate the engine class, imported on first use.
+        cost(n, top_k) estimates the number of comparisons for n photos.
+        options maps create_rating_system settings (top_k, confidence) to
+        the engine's constructor arguments. adaptive marks systems that stop
+        once their ranking settles, so their cost is only a first guess.
+        """
+        if name not in cls.systems:
+            cls.system_names.append(name)
+        cls.systems[name] = {
+            "module": module,
+            "class_name": class_name,
+            "short": short,
+            "long": long,
+            "cost": cost or per_photo(6),
+            "options": dict(options or {}),
+            "adaptive": adaptive,
+        }
+    
+    @classmethod
+    def system_info(cls, system_name):
+        """Return the registry entry of a rating system"""
+        return cls.systems[system_name]
+    
+    @classmethod
+    def estimated_matchups(cls, system_name, num_photos, top_k=20):
+        """Return the cost model's estimate for a system, without loading it"""
+        return cls.systems[system_name]["cost"](num_photos, top_k)
+    
+    @classmethod
+    def create_rating_system(cls, system_name, photo_files, top_k=20, confidence=0.8):
+        """Create the appropriate rating system based on name
+        
+        confidence is the expected Kendall tau to the true order at which the
+        Bradley-Terry, Glicko-2 and TrueSkill systems end the session.
+        """
+        # Default to Quick Sort if unknown
+        info = cls.systems.get(system_name, cls.systems["Quick Sort"])
+        engine_class = getattr(importlib.import_module(info["module"]), info["class_name"])
+        
+        # Pass on only the settings this engine takes
+        settings = {"top_k": top_k, "confidence": confidence}
+        kwargs = {argument: settings[setting] for setting, argument in info["options"].items()}
+        return engine_class(photo_files, **kwargs)
+
+# Built-in systems, in the order they are offered
+RatingFactory.register(
+    "Quick Sort", "rating_systems.quicksort_rating", "QuickSortRating",
+    short="Quick and efficient sorting algorithm",
+    long="Quick Sort is a divide-and-conquer algorithm that works by partitioning an array into two sub-arrays, then sorting the sub-arrays recursively. For images, this means fewer comparisons (n log n) than other methods. Real-world uses include sorting large datasets in database systems, programming language implementations, and in various computer science applications.",
+    cost=quicksort_comparisons,  # About n log2 n comparisons
+)
+
+RatingFactory.register(
+    "Merge Insertion", "rating_systems.merge_insertion_rating", "MergeInsertionRating",
+    short="Full ranking with the fewest possible taps",
+    long="Merge Insertion (the Ford-Johnson algorithm) pairs photos up, ranks the winners recursively, then binary-inserts the remaining photos in a carefully chosen order so that every search is as short as possible. It needs close to the theoretical minimum number of comparisons for a complete ranking (about n log n - 1.4n), noticeably fewer than Quick Sort, and never degrades on unlucky orderings. It is a classic result in sorting theory, used wherever comparisons are expensive.",
+    cost=merge_insertion_comparisons,  # Close to log2(n!) comparisons
+)
+
+RatingFactory.register(
+    "Top-K", "rating_systems.top_k_rating", "TopKRating",
+    short="Find only the best K photos",
+    long="Top-K runs a knockout tournament: photos play in a bracket until one champion remains, which takes n - 1 comparisons. Each further place only replays the matches on the previous winner's path, about log2(n) comparisons each, and matches that were already decided are never shown again. When you only need the best 20 shots out of thousands, this stops as soon as they are known instead of ordering the whole collection. The same idea is used for selection in sports tournaments and in tournament-tree algorithms.",
+    cost=top_k_comparisons,  # Knockout tournament: n - 1 for the winner, ~log2(n) for each further place
+    options={"top_k": "k"},
+)
+
+RatingFactory.register(
+    "Simple", "rating_systems.simple_rating", "SimpleRating",
+    short="Basic win/loss counting system",
+    long="The Simple rating system counts wins and losses for each item. It's straightforward to implement and understand but requires comparing all possible pairs (n²/2 comparisons). In the real world, it's used in basic sports rankings, informal competitions, and situations where simplicity is valued over statistical precision.",
+    cost=all_pairs_comparisons,  # Every pair once
+)
+
+RatingFactory.register(
+    "Elo", "rating_systems.elo_rating", "EloRating",
+    short="Chess rating system adapted for photos",
+    long="The Elo rating system, originally developed for chess rankings, calculates the relative skill levels between competitors. When comparing photos, higher-rated photos are expected to win against lower-rated ones. The system adjusts ratings based on actual outcomes vs. expected outcomes. Used in chess, sports leagues, video games (like League of Legends), and matchmaking systems worldwide.",
+    cost=per_photo(6),  # Roughly 5-7 per photo until the ranking settles
+    adaptive=True,
+)
+
+RatingFactory.register(
+    "Bradley-Terry", "rating_systems.bradley_terry_rating", "BradleyTerryRating",
+    short="Statistical model for paired comparisons",
+    long="The Bradley-Terry model is a probability model that predicts the outcome of paired comparisons. It assumes the probability of item A being chosen over item B is related to their underlying 'strength' parameters. Real-world applications include preference testing in market research, sports analytics, ranking systems in academia, and various choice modeling scenarios in psychology.",
+    cost=per_photo(10),  # Needs more data, ~10 comparisons per photo until the ranking settles
+    options={"confidence": "confidence"},
+    adaptive=True,
+)
+
+RatingFactory.register(
+    "Glicko-2", "rating_systems.glicko2_rating", "Glicko2Rating",
+    short="Enhanced Elo with rating deviation",
+    long="Glicko-2 extends the Elo system by tracking both a rating and a 'rating deviation' (uncertainty) for each item. This allows the system to be more cautious with items that have few comparisons. Used in online gaming platforms (such as Chess.com), competitive gaming leagues, and sports rating systems where the reliability of a rating is important.",
+    cost=per_photo(6),  # Roughly 5-7 per photo until the ranking settles
+    options={"confidence": "confidence"},
+    adaptive=True,
+)
+
+RatingFactory.register(
+    "TrueSkill", "rating_systems.trueskill_rating", "TrueSkillRating",
+    short="Microsoft's skill rating system",
+    long="TrueSkill was developed by Microsoft Research for Xbox Live to match players in competitive games. It uses Bayesian inference to track both skill level and uncertainty. TrueSkill allows for team-based and multiplayer rankings, and converges quickly with fewer comparisons. Used in Xbox Live matchmaking, Halo tournaments, and other gaming platforms to create balanced matches between players.",
+    cost=per_photo(6),  # Roughly 5-7 per photo until the ranking settles
+    options={"confidence": "confidence"},
+    adaptive=True,
+)
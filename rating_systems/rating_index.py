@@ -0,0 +1,91 @@
+import random
+import numpy as np
+from sortedcontainers import SortedList
+
+class RatingIndex:
+    """Photo ids kept in rating order, for drawing opponents near a rating
+    
+    Updating a rating is O(log n) and looking up the photos around a given
+    photo is O(log n + window), so opponent selection never scans the whole
+    collection.
+    """
+    
+    def __init__(self, ratings, window=64, tiebreaks=None):
+        # Number of neighbours considered on each side of a photo
+        self.window = window
+        
+        # Current sort key of every id, so entries can be found and removed.
+        # Ties are broken by a random value (redrawn on every update), so
+        # photos with equal ratings sit in random order rather than by id and
+        # early sessions, where all ratings are equal, don't keep pairing the
+        # same filename neighbours. A restored index passes the saved values
+        # in tiebreaks, so it continues exactly as the saved one would.
+        if tiebreaks is None:
+            self.keys = [(float(r), random.random()) for r in ratings]
+        else:
+            self.keys = [(float(r), float(t)) for r, t in zip(ratings, tiebreaks)]
+        self.order = SortedList((key + (i,) for i, key in enumerate(self.keys)))
+    
+    def update(self, index, rating):
+        """Move a photo id to its new rating"""
+        rating = float(rating)
+        if rating == self.keys[index][0]:
+            return
+        self.order.remove(self.keys[index] + (index,))
+        self.keys[index] = (rating, random.random())
+        self.order.add(self.keys[index] + (index,))
+    
+    def update_many(self, indices, ratings):
+        """Move several photo ids at once (e.g. after a batch of results)"""
+        indices = list(indices)
+        if len(indices) * 8 < len(self.keys):
+            for index, rating in zip(indices, ratings):
+                self.update(index, rating)
+            return
+        
+        # Touching a large share of the ids: re-sorting once is cheaper
+        for index, rating in zip(indices, ratings):
+            rating = float(rating)
+            if rating != self.keys[index][0]:
+                self.keys[index] = (rating, random.random())
+        self.order = SortedList((key + (i,) for i, key in enumerate(self.keys)))
+    
+    def tiebreaks(self):
+        """Return the tie-break value of every id, to save with the ratings"""
+        return np.array([key[1] for key in self.keys], dtype=np.float64)
+    
+    def top(self, k):
+        """Return the ids of the k highest ratings, best first with ties broken by lower id
+        
+        Walks down from the top of the index, so it costs O(k log n) rather
+        than a pass over every photo. Returns None when too many photos are
+        tied at the cut (e.g. before anything has been rated), in which case
+        a full scan is the better option.
+        """
+        k = min(k, len(self.order))
+        if k <= 0:
+            return []
+        
+        # Take the top k, plus any further photos tied with the k-th, since
+        # their random tie-break keys don't follow the id order
+        taken = []
+        for rating, _, index in self.order.islice(reverse=True):
+            if len(taken) >= k and rating != taken[k - 1][0]:
+                break
+            if len(taken) >= 4 * k + self.window:
+                return None
+            taken.append((rating, index))
+        
+        taken.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [index for _, index in taken[:k]]
+    
+    def neighbors(self, index):
+        """Return an array of the ids closest in rating order to index (excluding it)"""
+        pos = self.order.index(self.keys[index] + (index,))
+        lo = max(0, pos - self.window)
+        hi = min(len(self.order), pos + self.window + 1)
+        return np.fromiter(
+            (entry[2] for entry in self.order.islice(lo, hi) if entry[2] != index),
+            dtype=np.int64,
+            count=hi - lo - 1,
+        )
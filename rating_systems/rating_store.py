@@ -0,0 +1,45 @@
+import random
+import numpy as np
+
+class RatingStore:
+    """Struct-of-arrays storage for per-photo rating state"""
+    
+    def __init__(self, size):
+        # Number of photos; every array is indexed by photo id (0..size-1)
+        self.size = size
+        
+        # Named per-photo arrays
+        self.arrays = {}
+    
+    def add_array(self, name, fill_value, dtype=np.float64):
+        """Create a named per-photo array filled with fill_value and return it"""
+        array = np.full(self.size, fill_value, dtype=dtype)
+        self.arrays[name] = array
+        return array
+    
+    def load(self, arrays):
+        """Replace the stored arrays with same-named arrays (e.g. from a snapshot)"""
+        for name in self.arrays:
+            array = arrays[name]
+            if len(array) != self.size:
+                raise ValueError(f"Array {name} has {len(array)} entries, expected {self.size}")
+            self.arrays[name] = array
+    
+    def __getitem__(self, name):
+        return self.arrays[name]
+    
+    def nbytes(self):
+        """Return the total memory used by the stored arrays"""
+        return sum(array.nbytes for array in self.arrays.values())
+
+def weighted_index(weights):
+    """Pick an index with probability proportional to weights (vectorized)"""
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+    if total <= 0:
+        # No usable weights - fall back to a uniform choice
+        return random.randrange(len(weights))
+    
+    # Uses the stdlib RNG so that random.seed() controls every engine
+    index = int(np.searchsorted(cumulative, random.random() * total, side="right"))
+    return min(index, len(weights) - 1)
@@ -1,6 +1,8 @@
 from rating_systems.base_rating import BaseRating
+from rating_systems.rating_store import RatingStore
+import math
 import random
-from collections import defaultdict
+import numpy as np
 
 class SimpleRating(BaseRating):
     """Simple rating system based on win/loss counts"""
@@ -9,55 +11,115 @@ class SimpleRating(BaseRating):
         super().__init__(photo_files)
         self.name = "Simple"
         
-        # Initialize scores for each photo
-        self.scores = {photo: 0 for photo in photo_files}
+        # Initialize scores (wins) as an array indexed by photo id
+        self.store = RatingStore(len(self.photo_files))
+        self.scores = self.store.add_array("scores", 0, dtype=np.int64)
         
-        # Track comparisons to avoid duplicates
-        self.comparisons = set()
+        # Every pair is compared once: n(n-1)/2 comparisons
+        n = len(self.photo_files)
+        self.total_comparisons = n * (n - 1) // 2
         
-        # Pairs waiting to be compared
-        self.remaining_pairs = []
-        self.generate_all_pairs()
+        # Pairs are streamed in a pseudo-random order by walking a keyed
+        # permutation of the pair index space, so no pair list is stored.
+        # Progress is a single cursor into that permutation.
+        self.cursor = 0
+        self.shuffle_keys = [random.getrandbits(32) for _ in range(4)]
         
-        # Estimated total comparisons
-        self.total_comparisons = len(self.remaining_pairs)
+        # Feistel network over the smallest even bit width covering all pairs
+        bits = max(2, (self.total_comparisons - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
     
-    def generate_all_pairs(self):
-        """Generate all possible photo pairs for comparison"""
-        photo_list = list(self.photo_files)
-        for i in range(len(photo_list)):
-            for j in range(i + 1, len(photo_list)):
-                self.remaining_pairs.append((photo_list[i], photo_list[j]))
+    def _permute(self, index):
+        """Map a position to a pair index with a bijective keyed shuffle"""
+        while True:
+            left = index >> self.half_bits
+            right = index & self.half_mask
+            for key in self.shuffle_keys:
+                mixed = ((right * 0x9E3779B1) ^ key) & 0xFFFFFFFF
+                mixed = ((mixed ^ (mixed >> 15)) * 0x85EBCA6B) & 0xFFFFFFFF
+                left, right = right, left ^ (mixed & self.half_mask)
+            index = (left << self.half_bits) | right
+            
+            # Cycle-walk until the result falls inside [0, total_comparisons)
+            if index < self.total_comparisons:
+                return index
+    
+    def pair_at(self, position):
+        """Return the photo pair compared at a given cursor position"""
+        k = self._permute(position)
         
-        # Shuffle to randomize comparison order
-        random.shuffle(self.remaining_pairs)
+        # Unrank k into the pair (i, j) with i < j, where k = j(j-1)/2 + i
+        j = (1 + math.isqrt(1 + 8 * k)) // 2
+        i = k - j * (j - 1) // 2
+        return self.photo_files[i], self.photo_files[j]
     
     def get_next_matchup(self):
         """Return the next pair of photos to compare"""
-        if not self.remaining_pairs:
+        if self.cursor >= self.total_comparisons:
             return None, None
         
-        return self.remaining_pairs[0]
+        return self.pair_at(self.cursor)
+    
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming pairs (the order is fixed, so these are exact)"""
+        end = min(self.total_comparisons, self.cursor + max(0, k))
+        return [self.pair_at(position) for position in range(self.cursor, end)]
     
     def update_ratings(self, winner, loser):
         """Update ratings based on comparison result"""
+        if self.cursor >= self.total_comparisons:
+            return
+        
         # Verify this is the current pair
-        current_pair = self.remaining_pairs[0]
+        current_pair = self.pair_at(self.cursor)
         if set(current_pair) == set([winner, loser]):
             # Update scores
-            self.scores[winner] += 1
+            self.scores[self.photo_to_index[winner]] += 1
             
-            # Mark comparison as done
-            self.comparisons.add(tuple(sorted((winner, loser))))
-            self.remaining_pairs.pop(0)
+            # Advance to the next pair
+            self.cursor += 1
+            if self.known_outcomes:
+                self._resolve_known()
+    
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        # Pairs come in permutation order, so results are kept until their turn
+        self._remember_outcomes(winners, losers)
+        self._resolve_known()
+    
+    def _resolve_known(self):
+        """Skip over pairs whose result is already known from bulk results"""
+        while self.cursor < self.total_comparisons:
+            photo1, photo2 = self.pair_at(self.cursor)
+            winner = self._take_known_outcome(self.photo_to_index[photo1], self.photo_to_index[photo2])
+            if winner is None:
+                return
+            self.scores[winner] += 1
+            self.cursor += 1
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(cursor=self.cursor, shuffle_keys=self.shuffle_keys)
+        arrays.update(self.store.arrays)
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        self.cursor = state["cursor"]
+        self.shuffle_keys = state["shuffle_keys"]
+        self.store.load(arrays)
+        self.scores = self.store["scores"]
     
-    def get_current_rankings(self):
-        """Return sorted list of (photo_path, score) tuples"""
-        return sorted(self.scores.items(), key=lambda x: x[1], reverse=True)
+    def _ranking_scores(self):
+        """Return the array of per-id scores that rankings are sorted by"""
+        return self.scores
     
     def is_complete(self):
         """Return True if all comparisons have been made"""
-        return len(self.remaining_pairs) == 0
+        return self.cursor >= self.total_comparisons
     
     def estimated_matchups(self):
         """Return total number of matchups"""
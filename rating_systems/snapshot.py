@@ -0,0 +1,107 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+# File layout: fixed prefix, JSON header, then raw little-endian arrays.
+# Every array starts on an ALIGNMENT boundary so it can be memory-mapped
+# straight from the file.
+MAGIC = b"PMSNAP\0\0"
+VERSION = 2
+ALIGNMENT = 64
+
+# magic, version, reserved, header length
+PREFIX = struct.Struct("<8sHHI")
+
+def _aligned(offset):
+    """Round an offset up to the next ALIGNMENT boundary"""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def photo_checksum(photo_files):
+    """Fingerprint of the photo list, so a snapshot is only loaded for the same photos"""
+    return zlib.crc32("\n".join(photo_files).encode("utf-8"))
+
+def write_snapshot(path, engine_name, photo_files, state, arrays, metadata=None):
+    """Write plain-value state and named arrays to a snapshot file"""
+    # Lay out the arrays, little-endian and contiguous
+    table = {}
+    prepared = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        table[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        prepared.append((offset, array))
+        offset = _aligned(offset + array.nbytes)
+    
+    header = json.dumps({
+        "engine": engine_name,
+        "photos": len(photo_files),
+        "photo_checksum": photo_checksum(photo_files),
+        "state": state,
+        "arrays": table,
+        "metadata": metadata or {},
+    }).encode("utf-8")
+    data_start = _aligned(PREFIX.size + len(header))
+    
+    # Write to a temporary file and rename it into place, so an interrupted
+    # write never leaves a half-written snapshot behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, VERSION, 0, len(header)))
+        f.write(header)
+        for array_offset, array in prepared:
+            f.seek(data_start + array_offset)
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def snapshot_metadata(path):
+    """Return the metadata stored in a snapshot without loading it, or None if unreadable"""
+    try:
+        with open(path, "rb") as f:
+            magic, version, _, header_length = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            return json.loads(f.read(header_length).decode("utf-8"))["metadata"]
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+def read_snapshot(path, engine_name, photo_files):
+    """Read a snapshot and return (state, arrays, metadata)
+    
+    Arrays are memory-mapped copy-on-write: nothing is read until it is
+    used, and changing them never touches the file. Raises ValueError if
+    the file is not a snapshot of this engine and photo list.
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) < PREFIX.size:
+            raise ValueError("Not a photo matchup snapshot")
+        magic, version, _, header_length = PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError("Not a photo matchup snapshot")
+        if version != VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        header = json.loads(f.read(header_length).decode("utf-8"))
+    
+    if header["engine"] != engine_name:
+        raise ValueError(f"Snapshot is for {header['engine']}, not {engine_name}")
+    if header["photos"] != len(photo_files) or header["photo_checksum"] != photo_checksum(photo_files):
+        raise ValueError("Snapshot was taken with a different set of photos")
+    
+    data_start = _aligned(PREFIX.size + header_length)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if int(np.prod(shape)) == 0:
+            # Empty arrays can't be mapped
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="c", offset=data_start + entry["offset"], shape=shape)
+    
+    return header["state"], arrays, header["metadata"]
@@ -0,0 +1,151 @@
+from rating_systems.base_rating import BaseRating
+import numpy as np
+
+class StepwiseRating(BaseRating):
+    """Base class for engines that run a comparison algorithm step by step
+    
+    Subclasses implement _run() as a generator that yields (id_a, id_b)
+    pairs of photo ids and receives True when id_a was preferred. The
+    generator simply returns when the algorithm is finished, so the
+    algorithm can be written as ordinary sequential code while the GUI
+    drives it one tap at a time. Before yielding, it may set following to
+    the pairs that can come next (one per result), for peek_next_matchups.
+    
+    A generator can't be saved, so snapshots store the subclass's
+    initial_order plus every result fed in, and restoring replays them.
+    """
+    
+    def __init__(self, photo_files):
+        super().__init__(photo_files)
+        
+        # Pending comparison as a pair of photo ids (None when finished), and
+        # the pairs that may follow it depending on its result, if known
+        self.pending = None
+        self.following = []
+        self.finished = False
+        
+        # Provisional scores (wins so far) and progress counter
+        self.wins = [0] * len(self.photo_files)
+        self.completed_matches = 0
+    
+    def _start(self):
+        """Start the comparison algorithm (call at the end of __init__)"""
+        self._steps = self._run()
+        self.pending = None
+        self.finished = False
+        
+        # Every result fed to the algorithm, in order (1 = first photo won)
+        self.results = bytearray()
+        self._advance(None)
+    
+    def _run(self):
+        """Generator yielding (id_a, id_b) and receiving True if id_a won"""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _send(self, result):
+        """Feed one result to the algorithm; return False once it has finished"""
+        if result is not None:
+            self.results.append(result)
+        self.following = []
+        try:
+            self.pending = self._steps.send(result)
+        except StopIteration:
+            self.pending = None
+            self.finished = True
+            return False
+        return True
+    
+    def _advance(self, result):
+        """Feed a result to the algorithm and fetch its next comparison"""
+        while True:
+            if not self._send(result):
+                return
+            
+            # Answer the comparison ourselves if a bulk result already covers it
+            a, b = self.pending
+            winner = self._take_known_outcome(a, b)
+            if winner is None:
+                return
+            self.wins[winner] += 1
+            self.completed_matches += 1
+            result = winner == a
+    
+    def get_next_matchup(self):
+        """Return the next pair of photos to compare"""
+        if self.pending is None:
+            return None, None
+        
+        a, b = self.pending
+        return self.photo_files[a], self.photo_files[b]
+    
+    def peek_next_matchups(self, k):
+        """Return up to k pairs: the pending one, then those that may follow it
+        
+        The algorithm picks its next comparison from the pending result, so
+        after the pending pair come the candidates for either result (as
+        far as the subclass can tell), not a fixed sequence. Where the next
+        pair depends on more than the pending result, such as at the end of
+        a round, only the pending pair is returned.
+        """
+        if self.pending is None or k <= 0:
+            return []
+        pairs = [self.pending] + [pair for pair in self.following if pair != self.pending]
+        return [(self.photo_files[a], self.photo_files[b]) for a, b in pairs[:k]]
+    
+    def update_ratings(self, winner, loser):
+        """Update based on comparison result"""
+        if self.pending is None:
+            return
+        
+        # Verify this is the current pair
+        a, b = self.pending
+        if set((self.photo_files[a], self.photo_files[b])) != set([winner, loser]):
+            return
+        
+        self.wins[self.photo_to_index[winner]] += 1
+        self.completed_matches += 1
+        self._advance(winner == self.photo_files[a])
+    
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        # The algorithm decides what to compare, so results are kept until it asks
+        self._remember_outcomes(winners, losers)
+        if self.pending is None:
+            return
+        
+        a, b = self.pending
+        winner = self._take_known_outcome(a, b)
+        if winner is not None:
+            self.wins[winner] += 1
+            self.completed_matches += 1
+            self._advance(winner == a)
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state["completed_matches"] = self.completed_matches
+        arrays["initial_order"] = np.array(self.initial_order, dtype=np.int32)
+        arrays["wins"] = np.array(self.wins, dtype=np.int64)
+        arrays["results"] = np.frombuffer(bytes(self.results), dtype=np.uint8)
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        self.completed_matches = state["completed_matches"]
+        self.initial_order = arrays["initial_order"].tolist()
+        self.wins = arrays["wins"].tolist()
+        
+        # Rerun the algorithm from the same starting order with the recorded
+        # results (no photos are shown and no known outcomes are consulted)
+        self._steps = self._run()
+        self.pending = None
+        self.finished = False
+        self.results = bytearray()
+        self._send(None)
+        for result in arrays["results"].tolist():
+            self._send(result)
+    
+    def is_complete(self):
+        """Return True if the rating process is complete"""
+        return self.finished
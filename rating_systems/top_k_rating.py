@@ -0,0 +1,137 @@
+from rating_systems.stepwise_rating import StepwiseRating
+from rating_systems.cost_models import top_k_comparisons
+import heapq
+import random
+
+class TopKRating(StepwiseRating):
+    """Knockout tournament that finds only the best K photos, in order"""
+    
+    def __init__(self, photo_files, k=20):
+        super().__init__(photo_files)
+        self.name = "Top-K"
+        
+        self.n = len(self.photo_files)
+        self.k = max(1, min(k, self.n))
+        
+        # Randomize the bracket
+        self.initial_order = list(range(self.n))
+        random.shuffle(self.initial_order)
+        
+        # Outcomes already decided: (low_id, high_id) -> winner id.
+        # Replays reuse them, so a pair is never shown twice.
+        self.outcomes = {}
+        
+        # Best photos found so far, best first
+        self.top = []
+        
+        self.est_matchups = self.worst_case_comparisons(self.n, self.k)
+        self._start()
+    
+    # n - 1 for the first winner plus ceil(log2 n) for each further place
+    worst_case_comparisons = staticmethod(top_k_comparisons)
+    
+    def _match(self, a, b):
+        """Return the winner of a vs b, asking only if it is not known yet"""
+        if a < 0:
+            return b
+        if b < 0:
+            return a
+        
+        key = (a, b) if a < b else (b, a)
+        winner = self.outcomes.get(key)
+        if winner is None:
+            a_wins = yield (a, b)
+            winner = a if a_wins else b
+            self.outcomes[key] = winner
+        return winner
+    
+    def _run(self):
+        """Play the tournament, then replay the champion's path for each further place"""
+        # Complete binary tree over the leaves; -1 marks an empty slot
+        size = 1
+        while size < self.n:
+            size *= 2
+        tree = [-1] * (2 * size)
+        leaf_of = {}
+        for pos, photo_id in enumerate(self.initial_order):
+            tree[size + pos] = photo_id
+            leaf_of[photo_id] = size + pos
+        
+        # First winner: n - 1 comparisons
+        for node in range(size - 1, 0, -1):
+            self.following = self._following(tree, node, node - 1) if node > 1 else []
+            tree[node] = yield from self._match(tree[2 * node], tree[2 * node + 1])
+        
+        while True:
+            champion = tree[1]
+            self.top.append(champion)
+            if len(self.top) >= self.k:
+                return
+            
+            # Remove the champion and replay only the matches on its path
+            node = leaf_of[champion]
+            tree[node] = -1
+            node //= 2
+            while node:
+                self.following = self._following(tree, node, node // 2) if node > 1 else []
+                tree[node] = yield from self._match(tree[2 * node], tree[2 * node + 1])
+                node //= 2
+    
+    def _following(self, tree, node, after):
+        """Return the pairs the match at node after may ask about, once the match at node is decided"""
+        left, right = tree[2 * after], tree[2 * after + 1]
+        if node == 2 * after:
+            pairs = [(winner, right) for winner in (tree[2 * node], tree[2 * node + 1])]
+        elif node == 2 * after + 1:
+            pairs = [(left, winner) for winner in (tree[2 * node], tree[2 * node + 1])]
+        else:
+            pairs = [(left, right)]
+        
+        # Empty slots and decided pairs are never asked about
+        return [(a, b) for a, b in pairs if a >= 0 and b >= 0
+                and ((a, b) if a < b else (b, a)) not in self.outcomes]
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(k=self.k, est_matchups=self.est_matchups)
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        self.k = state["k"]
+        self.est_matchups = state["est_matchups"]
+        
+        # Rebuilt by replaying the recorded results
+        self.outcomes = {}
+        self.top = []
+        super()._restore_state(state, arrays)
+    
+    def get_current_rankings(self):
+        """Return sorted list of (photo_path, score) tuples"""
+        return self._ranked(self.n)
+    
+    def get_top_rankings(self, k):
+        """Return the best k (photo_path, score) tuples, in the same order as get_current_rankings"""
+        return self._ranked(k)
+    
+    def iter_rankings(self):
+        """Yield (photo_path, score) tuples best first"""
+        yield from self._ranked(self.n)
+    
+    def _ranked(self, k):
+        """Return the first k entries of the rankings"""
+        # Confirmed top photos first, the rest in provisional order by wins
+        order = self.top[:k]
+        if len(order) < k:
+            found = set(self.top)
+            # Heap selection: same result as sorting the rest and slicing
+            order += heapq.nlargest(k - len(order), (i for i in range(self.n) if i not in found),
+                                    key=self.wins.__getitem__)
+        
+        # Score is the position (higher position = higher rank)
+        return [(self.photo_files[i], self.n - r) for r, i in enumerate(order)]
+    
+    def estimated_matchups(self):
+        """Return an estimate of the total number of matchups needed"""
+        return self.est_matchups
@@ -1,12 +1,15 @@
 from rating_systems.base_rating import BaseRating
-import random
+from rating_systems.rating_store import RatingStore
+from rating_systems.weighted_sampler import WeightedSampler
+from rating_systems.rating_index import RatingIndex
+from rating_systems.convergence import ConvergenceMonitor
 import math
-from collections import defaultdict
+import numpy as np
 
 class TrueSkillRating(BaseRating):
     """Microsoft's TrueSkill rating system"""
     
-    def __init__(self, photo_files):
+    def __init__(self, photo_files, confidence=0.8):
         super().__init__(photo_files)
         self.name = "TrueSkill"
         
@@ -15,88 +18,87 @@ class TrueSkillRating(BaseRating):
         self.tau = 25.0 / 300  # Dynamic factor (additive dynamics variance per comparison)
         self.draw_probability = 0.0  # No draws in our application
         
-        # Initialize skills and uncertainties
-        self.mu = {photo: 25.0 for photo in photo_files}  # Mean skill
-        self.sigma = {photo: 25.0 / 3 for photo in photo_files}  # Skill uncertainty
+        # Initialize skills and uncertainties as arrays indexed by photo id
+        self.store = RatingStore(len(self.photo_files))
+        self.mu = self.store.add_array("mu", 25.0)  # Mean skill
+        self.sigma = self.store.add_array("sigma", 25.0 / 3)  # Skill uncertainty
         
         # Track number of comparisons
-        self.comparisons = {photo: 0 for photo in photo_files}
+        self.comparisons = self.store.add_array("comparisons", 0, dtype=np.int32)
         
-        # Total matches to perform (approximately 6 per photo)
+        # First-photo sampler weighted by uncertainty (sigma)
+        self.sampler = WeightedSampler(self.sigma)
+        
+        # Photos ordered by mean skill, for picking opponents near photo1
+        self.rating_index = RatingIndex(self.mu, window=32)
+        
+        # Number of uncertain photos whose neighbourhoods are scored per matchup
+        self.anchors_per_matchup = 4
+        
+        # At most 6 matches per photo; the session ends earlier
+        # once the skill posteriors put the order at the requested
+        # confidence, or the order stops changing
         self.total_matches = len(photo_files) * 6
         self.completed_matches = 0
+        self.convergence = ConvergenceMonitor(len(self.photo_files), self.total_matches, confidence=confidence)
         
         # Current matchup
         self.current_matchup = None
     
     def get_next_matchup(self):
         """Return the next pair of photos to compare"""
-        if self.completed_matches >= self.total_matches:
+        if self.is_complete():
             return None, None
         
-        # Select photos based on uncertainty and expected information gain
-        photos = list(self.photo_files)
-        
-        # Weight selection by uncertainty (sigma)
-        weights = [self.sigma[p] for p in photos]
-        total_weight = sum(weights)
-        weights = [w / total_weight for w in weights]
-        
-        # Select first photo based on uncertainty
-        photo1 = random.choices(photos, weights=weights, k=1)[0]
-        
-        # For second photo, select one that would give most information
-        remaining = [p for p in photos if p != photo1]
-        
-        # Calculate expected information gain for each potential opponent
-        info_gains = []
-        mu1 = self.mu[photo1]
-        sigma1 = self.sigma[photo1]
-        
-        for p in remaining:
-            mu2 = self.mu[p]
-            sigma2 = self.sigma[p]
-            
-            # Calculate draw margin
-            draw_margin = self.beta * math.sqrt(2)
-            
-            # Calculate expected information gain
-            # Higher when skills are close and uncertainties are high
-            skill_diff = abs(mu1 - mu2)
-            total_uncertainty = math.sqrt(sigma1**2 + sigma2**2 + 2 * self.beta**2)
-            
-            # More information when skills are similar and uncertainties are high
-            if total_uncertainty > 0:
-                info_gain = (1 - skill_diff / (3 * total_uncertainty)) * total_uncertainty
-                info_gain = max(0.1, info_gain)  # Ensure all have some chance
-            else:
-                info_gain = 0.1
-                
-            info_gains.append(info_gain)
-        
-        # Normalize weights
-        total_gain = sum(info_gains)
-        if total_gain > 0:
-            info_gains = [g / total_gain for g in info_gains]
-            photo2 = random.choices(remaining, weights=info_gains, k=1)[0]
-        else:
-            photo2 = random.choice(remaining)
+        # Taken from the pairs reserved by peek_next_matchups, if any
+        idx1, idx2 = self._next_reserved()
         
+        photo1 = self.photo_files[idx1]
+        photo2 = self.photo_files[idx2]
         self.current_matchup = (photo1, photo2)
         return self.current_matchup
     
+    def peek_next_matchups(self, k):
+        """Return up to k upcoming pairs, drawn now and reserved until they are shown"""
+        return self._reserve_matchups(k)
+    
+    def _draw_matchup(self):
+        """Pick a new pair of photo ids"""
+        # Candidate pairs: a few uncertain photos (drawn by sigma), each paired
+        # with the photos closest to it in mean skill
+        firsts = []
+        seconds = []
+        for _ in range(self.anchors_per_matchup):
+            anchor = self.sampler.sample()
+            neighbors = self.rating_index.neighbors(anchor)
+            firsts.append(np.full(len(neighbors), anchor))
+            seconds.append(neighbors)
+        firsts = np.concatenate(firsts)
+        seconds = np.concatenate(seconds)
+        
+        # Pick the pair whose outcome is expected to shrink posterior variance most
+        gains = self._expected_variance_reduction(firsts, seconds)
+        best = int(np.argmax(gains))
+        idx1 = int(firsts[best])
+        idx2 = int(seconds[best])
+        
+        return idx1, idx2
+    
     def update_ratings(self, winner, loser):
         """Update TrueSkill ratings based on comparison result"""
         # Verify this is the current pair
         if set(self.current_matchup) != set([winner, loser]):
             return
             
+        winner_idx = self.photo_to_index[winner]
+        loser_idx = self.photo_to_index[loser]
+        
         # Get current skills
-        mu_winner = self.mu[winner]
-        sigma_winner = self.sigma[winner]
+        mu_winner = float(self.mu[winner_idx])
+        sigma_winner = float(self.sigma[winner_idx])
         
-        mu_loser = self.mu[loser]
-        sigma_loser = self.sigma[loser]
+        mu_loser = float(self.mu[loser_idx])
+        sigma_loser = float(self.sigma[loser_idx])
         
         # Calculate variance of the sum of the two skills
         c = math.sqrt(2 * self.beta**2 + sigma_winner**2 + sigma_loser**2)
@@ -121,23 +123,131 @@ class TrueSkillRating(BaseRating):
         sigma_loser_new = math.sqrt(sigma_loser_new**2 + self.tau**2)
         
         # Store updated values
-        self.mu[winner] = mu_winner_new
-        self.sigma[winner] = sigma_winner_new
+        self.mu[winner_idx] = mu_winner_new
+        self.sigma[winner_idx] = sigma_winner_new
+        self.mu[loser_idx] = mu_loser_new
+        self.sigma[loser_idx] = sigma_loser_new
         
-        self.mu[loser] = mu_loser_new
-        self.sigma[loser] = sigma_loser_new
+        # Refresh selection structures for the two photos
+        self.rating_index.update(winner_idx, mu_winner_new)
+        self.rating_index.update(loser_idx, mu_loser_new)
+        self.sampler.update(winner_idx, sigma_winner_new)
+        self.sampler.update(loser_idx, sigma_loser_new)
         
         # Update comparison counts
-        self.comparisons[winner] += 1
-        self.comparisons[loser] += 1
+        self.comparisons[winner_idx] += 1
+        self.comparisons[loser_idx] += 1
         self.completed_matches += 1
+        self.convergence.observe(self)
+        self._release_reserved((winner_idx, loser_idx))
         
         # Reset current matchup
         self.current_matchup = None
     
+    def update_many(self, winners, losers):
+        """Apply a batch of results given as arrays of winner and loser photo ids"""
+        winners = np.asarray(winners, dtype=np.int64)
+        losers = np.asarray(losers, dtype=np.int64)
+        keep = winners != losers
+        winners, losers = winners[keep], losers[keep]
+        self._release_reserved()
+        
+        # Applied in spans ending where convergence is checked, so the checks
+        # see the same skills as when playing tap by tap
+        for start, stop in self.convergence.spans(len(winners)):
+            self._apply_results(winners[start:stop], losers[start:stop])
+            self.convergence.observe(self, stop - start)
+    
+    def _apply_results(self, winners, losers):
+        """Apply results given as arrays of winner and loser photo ids"""
+        # Each update depends on the previous ones, so results are applied
+        # one by one, but on plain floats with the selection structures
+        # refreshed once for the whole batch
+        mu = self.mu.tolist()
+        sigma = self.sigma.tolist()
+        two_beta_sq = 2 * self.beta**2
+        tau_sq = self.tau**2
+        for winner_idx, loser_idx in zip(winners.tolist(), losers.tolist()):
+            mu_winner, sigma_winner = mu[winner_idx], sigma[winner_idx]
+            mu_loser, sigma_loser = mu[loser_idx], sigma[loser_idx]
+            
+            c = math.sqrt(two_beta_sq + sigma_winner**2 + sigma_loser**2)
+            mean_diff = mu_winner - mu_loser
+            v = self._v(mean_diff / c)
+            w = v * (v + mean_diff / c)
+            
+            mu[winner_idx] = mu_winner + (sigma_winner**2 / c) * v
+            mu[loser_idx] = mu_loser - (sigma_loser**2 / c) * v
+            sigma_winner_new = sigma_winner * math.sqrt(1 - (sigma_winner**2 / c**2) * w)
+            sigma_loser_new = sigma_loser * math.sqrt(1 - (sigma_loser**2 / c**2) * w)
+            sigma[winner_idx] = math.sqrt(sigma_winner_new**2 + tau_sq)
+            sigma[loser_idx] = math.sqrt(sigma_loser_new**2 + tau_sq)
+        self.mu[:] = mu
+        self.sigma[:] = sigma
+        
+        self.comparisons += np.bincount(winners, minlength=len(mu)).astype(np.int32)
+        self.comparisons += np.bincount(losers, minlength=len(mu)).astype(np.int32)
+        self.completed_matches += len(winners)
+        
+        touched = np.unique(np.concatenate([winners, losers]))
+        self.rating_index.update_many(touched.tolist(), self.mu[touched].tolist())
+        self.sampler.rebuild(self.sigma)
+    
+    def _snapshot_state(self):
+        """Return (dict of plain values, dict of arrays) describing the engine"""
+        state, arrays = super()._snapshot_state()
+        state.update(beta=self.beta, tau=self.tau, anchors_per_matchup=self.anchors_per_matchup,
+                     total_matches=self.total_matches, completed_matches=self.completed_matches)
+        arrays.update(self.store.arrays)
+        
+        convergence_state, convergence_arrays = self.convergence.to_state()
+        state["convergence"] = convergence_state
+        arrays.update(convergence_arrays)
+        arrays["index_tiebreaks"] = self.rating_index.tiebreaks()
+        return state, arrays
+    
+    def _restore_state(self, state, arrays):
+        """Load the values and arrays returned by _snapshot_state"""
+        super()._restore_state(state, arrays)
+        self.beta = state["beta"]
+        self.tau = state["tau"]
+        self.anchors_per_matchup = state["anchors_per_matchup"]
+        self.total_matches = state["total_matches"]
+        self.completed_matches = state["completed_matches"]
+        self.convergence.load_state(state["convergence"], arrays)
+        
+        self.store.load(arrays)
+        self.mu = self.store["mu"]
+        self.sigma = self.store["sigma"]
+        self.comparisons = self.store["comparisons"]
+        
+        # Selection structures are derived from the arrays
+        self.sampler.rebuild(self.sigma)
+        self.rating_index = RatingIndex(self.mu, window=self.rating_index.window,
+                                        tiebreaks=arrays["index_tiebreaks"])
+        self.current_matchup = None
+    
+    def _expected_variance_reduction(self, firsts, seconds):
+        """Expected drop in sigma_i^2 + sigma_j^2 from comparing each pair (batched)"""
+        var1 = self.sigma[firsts] ** 2
+        var2 = self.sigma[seconds] ** 2
+        c_sq = 2 * self.beta**2 + var1 + var2
+        t = (self.mu[firsts] - self.mu[seconds]) / np.sqrt(c_sq)
+        
+        # Probability that the first photo wins, and the TrueSkill w factor
+        # for each outcome (variance multiplier is 1 - sigma^2 / c^2 * w)
+        p_first = _norm_cdf(t)
+        density = _norm_pdf(t)
+        v_first = density / np.maximum(p_first, 1e-12)
+        v_second = density / np.maximum(1 - p_first, 1e-12)
+        w_first = v_first * (v_first + t)
+        w_second = v_second * (v_second - t)
+        
+        expected_w = p_first * w_first + (1 - p_first) * w_second
+        return (var1**2 + var2**2) / c_sq * expected_w
+    
     def _v(self, x):
         """Helper function for TrueSkill updates"""
-        sqrt2pi = math.sqrt(2 * math.pi)
         return self._pdf(x) / self._cdf(x)
     
     def _pdf(self, x):
@@ -148,22 +258,32 @@ class TrueSkillRating(BaseRating):
         """Cumulative distribution function for normal distribution"""
         return (1.0 + math.erf(x / math.sqrt(2))) / 2.0
     
-    def get_current_rankings(self):
-        """Return sorted list of (photo_path, score) tuples"""
-        # Calculate conservative skill estimate: mu - 3*sigma
-        scores = []
-        for photo in self.photo_files:
-            # Use conservative skill estimate (mu - sigma) as score
-            # This balances exploration and exploitation
-            conservative_skill = self.mu[photo] - self.sigma[photo]
-            scores.append((photo, conservative_skill))
-        
-        return sorted(scores, key=lambda x: x[1], reverse=True)
+    def _ranking_scores(self):
+        """Return the array of per-id scores that rankings are sorted by"""
+        # Conservative skill estimate (mu - sigma) as score, so photos
+        # with few comparisons don't rank high on one lucky win
+        return self.mu - self.sigma
+    
+    def _convergence_estimates(self):
+        """Return (scores, posterior means, posterior sds) for the convergence monitor"""
+        return self.mu - self.sigma, self.mu, self.sigma
     
     def is_complete(self):
-        """Return True if all scheduled matches have been completed"""
-        return self.completed_matches >= self.total_matches
+        """Return True once the ranking has settled"""
+        return self.convergence.complete
     
     def estimated_matchups(self):
-        """Return total number of matchups"""
-        return self.total_matches
+        """Return the expected total number of matchups (revised as the ranking settles)"""
+        return self.convergence.estimated_taps()
+
+def _norm_pdf(x):
+    """Standard normal density (vectorized)"""
+    return np.exp(-0.5 * x * x) / math.sqrt(2 * math.pi)
+
+def _norm_cdf(x):
+    """Standard normal CDF (vectorized, Abramowitz-Stegun 7.1.26, error < 1.5e-7)"""
+    z = np.abs(x) / math.sqrt(2)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
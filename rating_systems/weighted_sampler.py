@@ -0,0 +1,81 @@
+import random
+import numpy as np
+
+class WeightedSampler:
+    """Dynamic weighted sampling over photo ids backed by a Fenwick tree
+    
+    Point updates and draws are O(log n), so engines only pay for the
+    weights that actually changed after a comparison.
+    """
+    
+    def __init__(self, weights):
+        self.n = len(weights)
+        
+        # Highest power of two <= n, used to walk the tree top-down
+        self.top = 1 << (self.n.bit_length() - 1) if self.n else 0
+        
+        self.rebuild(weights)
+    
+    def rebuild(self, weights):
+        """Rebuild the tree from a full weight vector in O(n)"""
+        weights = np.asarray(weights, dtype=np.float64)
+        
+        # tree[i] holds the sum of weights in (i - lowbit(i), i] (1-based)
+        prefix = np.concatenate(([0.0], np.cumsum(weights)))
+        idx = np.arange(1, self.n + 1)
+        tree = np.zeros(self.n + 1)
+        tree[1:] = prefix[idx] - prefix[idx - (idx & -idx)]
+        
+        # Plain lists are much faster than NumPy for the per-element walks
+        self.weights = weights.tolist()
+        self.tree = tree.tolist()
+        
+        # Periodic rebuilds keep floating-point drift from accumulating
+        self.updates_since_rebuild = 0
+    
+    def update(self, index, weight):
+        """Set the weight of a single id"""
+        delta = weight - self.weights[index]
+        if delta == 0:
+            return
+        self.weights[index] = weight
+        
+        i = index + 1
+        tree = self.tree
+        while i <= self.n:
+            tree[i] += delta
+            i += i & -i
+        
+        self.updates_since_rebuild += 1
+        if self.updates_since_rebuild > self.n:
+            self.rebuild(self.weights)
+    
+    def total(self):
+        """Return the sum of all weights"""
+        total = 0.0
+        i = self.n
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+    
+    def sample(self):
+        """Draw an id with probability proportional to its weight"""
+        total = self.total()
+        if total <= 0:
+            return random.randrange(self.n)
+        
+        # Descend the tree looking for the first prefix sum above the target
+        target = random.random() * total
+        pos = 0
+        step = self.top
+        tree = self.tree
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        
+        # pos is the 0-based id; guard against rounding past the last id
+        return min(pos, self.n - 1)
@@ -0,0 +1,104 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from rating_systems.rating_factory import RatingFactory
+from utils.comparison_log import ComparisonLog
+
+def load_folder_photos(folder_path):
+    """Return the image files of a folder, as the home screen lists them"""
+    return [
+        os.path.join(folder_path, f) for f in os.listdir(folder_path)
+        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff'))
+    ]
+
+def replay(log_path, system_name, folder_path=None, batch_size=65536, top_k=20):
+    """Feed a comparison log to a rating system and return (rating_system, stats)"""
+    log = ComparisonLog(log_path)
+    stats = {}
+    
+    # Pass 1: build the path <-> id table once
+    start = time.perf_counter()
+    resolve = None
+    if folder_path:
+        photo_files = load_folder_photos(folder_path)
+        photo_to_index = {os.path.abspath(p): i for i, p in enumerate(photo_files)}
+        # Relative paths in the log are relative to the folder
+        resolve = lambda p: os.path.abspath(os.path.join(folder_path, p))
+    else:
+        photo_files = log.photos()
+        photo_to_index = {p: i for i, p in enumerate(photo_files)}
+    stats["photos"] = len(photo_files)
+    stats["index_seconds"] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    rating_system = RatingFactory.create_rating_system(system_name, photo_files, top_k=top_k)
+    stats["setup_seconds"] = time.perf_counter() - start
+    
+    # Pass 2: stream ids into the engine a batch at a time
+    start = time.perf_counter()
+    apply_seconds = 0.0
+    for winners, losers in log.id_batches(photo_to_index, batch_size, resolve):
+        batch_start = time.perf_counter()
+        rating_system.update_many(winners, losers)
+        apply_seconds += time.perf_counter() - batch_start
+    stats["replay_seconds"] = time.perf_counter() - start
+    stats["apply_seconds"] = apply_seconds
+    stats["rows"] = log.rows
+    stats["skipped"] = log.skipped
+    
+    return rating_system, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-rate a recorded comparison log (CSV or JSONL) without the GUI")
+    parser.add_argument("log", help="CSV with winner,loser columns, or JSONL with winner/loser keys")
+    parser.add_argument("--system", default="Elo", choices=RatingFactory.system_names,
+                        help="Rating system to replay the log through (default: Elo)")
+    parser.add_argument("--folder", help="Rate the photos in this folder instead of the photos named in the log")
+    parser.add_argument("--batch-size", type=int, default=65536, help="Results handed to the engine per call")
+    parser.add_argument("--top-k", type=int, default=20, help="K for the Top-K system")
+    parser.add_argument("--seed", type=int, help="Seed the random module for a reproducible run")
+    parser.add_argument("--show", type=int, default=20, help="Number of ranked photos to print (0 = all)")
+    parser.add_argument("--output", help="Write the full rankings to this CSV file")
+    args = parser.parse_args(argv)
+    
+    if args.seed is not None:
+        random.seed(args.seed)
+    
+    rating_system, stats = replay(args.log, args.system, args.folder, args.batch_size, args.top_k)
+    
+    # The full order is only needed for --output or --show 0
+    start = time.perf_counter()
+    if args.output or args.show <= 0:
+        rankings = rating_system.get_current_rankings()
+    else:
+        rankings = rating_system.get_top_rankings(args.show)
+    stats["rankings_seconds"] = time.perf_counter() - start
+    
+    # Throughput report goes to stderr so stdout can be piped
+    used = stats["rows"] - stats["skipped"]
+    print(f"System: {rating_system.name}", file=sys.stderr)
+    print(f"Photos: {stats['photos']}  Rows: {stats['rows']}  Applied: {used}  Skipped: {stats['skipped']}",
+          file=sys.stderr)
+    print(f"Path table: {stats['index_seconds']:.2f}s  Setup: {stats['setup_seconds']:.2f}s  "
+          f"Replay: {stats['replay_seconds']:.2f}s (engine {stats['apply_seconds']:.2f}s)  "
+          f"Rankings: {stats['rankings_seconds']:.2f}s", file=sys.stderr)
+    if stats["replay_seconds"] > 0:
+        print(f"Throughput: {used / stats['replay_seconds']:,.0f} rows/s", file=sys.stderr)
+    
+    shown = rankings if args.show <= 0 else rankings[:args.show]
+    for rank, (photo, score) in enumerate(shown, 1):
+        print(f"{rank:>6}  {float(score):>12.3f}  {photo}")
+    
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["rank", "score", "photo"])
+            for rank, (photo, score) in enumerate(rankings, 1):
+                writer.writerow([rank, float(score), photo])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import random
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt5")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication
+
+from gui.matchup_screen import MatchupScreen
+from rating_systems.rating_factory import RatingFactory
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture
+def screen(app, tmp_path):
+    """A matchup screen over a few unreadable files (shown as errors, not pending)"""
+    photo_files = []
+    for i in range(6):
+        path = tmp_path / f"photo_{i}.jpg"
+        path.write_bytes(b"")
+        photo_files.append(str(path))
+    
+    random.seed(1)
+    rating_system = RatingFactory.create_rating_system("Elo", photo_files)
+    screen = MatchupScreen(photo_files, rating_system)
+    yield screen
+    screen.image_loader.shutdown()
+
+def test_tap_during_half_loaded_matchup_is_not_recorded(screen):
+    """Tapping the shown photo while the other one is still loading records nothing"""
+    shown, loading = screen.left_photo, screen.right_photo
+    matchup = (shown.photo_path, loading.photo_path)
+    shown.pending = False
+    loading.show_pending(loading.photo_path)
+    
+    screen.photo_selected(0)
+    
+    assert screen.rating_system.completed_matches == 0
+    assert (screen.left_photo.photo_path, screen.right_photo.photo_path) == matchup
+
+def test_tap_with_both_photos_shown_is_recorded(screen):
+    screen.left_photo.pending = False
+    screen.right_photo.pending = False
+    
+    screen.photo_selected(0)
+    
+    assert screen.rating_system.completed_matches == 1
@@ -0,0 +1,80 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rating_systems.glicko2_rating import Glicko2Rating
+from rating_systems.merge_insertion_rating import MergeInsertionRating
+from rating_systems.simple_rating import SimpleRating
+from rating_systems.top_k_rating import TopKRating
+
+def play(engine, latent):
+    """Answer every comparison by the higher latent score until the engine finishes"""
+    photo_to_index = engine.photo_to_index
+    while True:
+        photo1, photo2 = engine.get_next_matchup()
+        if photo1 is None:
+            return
+        if latent[photo_to_index[photo1]] > latent[photo_to_index[photo2]]:
+            engine.update_ratings(photo1, photo2)
+        else:
+            engine.update_ratings(photo2, photo1)
+
+def true_order(photo_files, latent):
+    """Return the photos best first"""
+    return [photo_files[i] for i in np.argsort(-latent)]
+
+@pytest.mark.parametrize("n", [2, 3, 10, 57, 300])
+def test_simple_pair_order_is_a_bijection(n):
+    """The keyed shuffle visits every pair exactly once"""
+    random.seed(n)
+    engine = SimpleRating([f"photo_{i}.jpg" for i in range(n)])
+    total = engine.total_comparisons
+    
+    assert sorted(engine._permute(i) for i in range(total)) == list(range(total))
+    pairs = {frozenset(engine.pair_at(i)) for i in range(total)}
+    assert len(pairs) == total
+    assert all(len(pair) == 2 for pair in pairs)
+
+@pytest.mark.parametrize("n", list(range(1, 24)) + [50, 128, 200])
+def test_merge_insertion_sorts_within_worst_case(n):
+    random.seed(n)
+    photo_files = [f"photo_{i}.jpg" for i in range(n)]
+    latent = np.random.default_rng(n).permutation(n).astype(np.float64)
+    engine = MergeInsertionRating(photo_files)
+    
+    play(engine, latent)
+    
+    assert engine.is_complete()
+    assert [photo for photo, _ in engine.get_current_rankings()] == true_order(photo_files, latent)
+    assert engine.completed_matches <= MergeInsertionRating.worst_case_comparisons(n)
+
+@pytest.mark.parametrize("n, k", [(1, 1), (2, 1), (7, 3), (20, 5), (64, 10), (100, 20), (150, 150)])
+def test_top_k_finds_best_k_within_estimate(n, k):
+    random.seed(n)
+    photo_files = [f"photo_{i}.jpg" for i in range(n)]
+    latent = np.random.default_rng(n).permutation(n).astype(np.float64)
+    engine = TopKRating(photo_files, k=k)
+    
+    play(engine, latent)
+    
+    assert engine.is_complete()
+    assert [photo for photo, _ in engine.get_top_rankings(k)] == true_order(photo_files, latent)[:k]
+    assert engine.completed_matches <= engine.estimated_matchups()
+
+def test_glicko2_reproduces_glickman_example():
+    """The worked example of Glickman's "Example of the Glicko-2 system" (tau = 0.5)"""
+    engine = Glicko2Rating(["player.jpg", "a.jpg", "b.jpg", "c.jpg"], period_length=3)
+    engine.ratings[:] = [1500, 1400, 1550, 1700]
+    engine.rds[:] = [200, 30, 100, 300]
+    
+    # The player beats the first opponent and loses to the other two, in one period
+    engine.update_many([0, 2, 3], [1, 0, 0])
+    
+    assert engine.ratings[0] == pytest.approx(1464.05, abs=0.01)
+    assert engine.rds[0] == pytest.approx(151.52, abs=0.01)
+    assert engine.volatilities[0] == pytest.approx(0.05999, abs=1e-5)
@@ -0,0 +1,98 @@
+import csv
+import json
+import os
+import numpy as np
+
+class ComparisonLog:
+    """Streaming reader for recorded comparison logs
+    
+    A log is either CSV (a header with "winner" and "loser" columns, or no
+    header and winner, loser as the first two columns) or JSONL (one
+    {"winner": ..., "loser": ...} object per line). The file is read
+    row by row, so memory stays bounded by the photo table and one batch
+    no matter how many rows the log has.
+    """
+    
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.is_jsonl = os.path.splitext(log_path)[1].lower() in (".jsonl", ".ndjson")
+        
+        # Counters for the last pass over the file
+        self.rows = 0
+        self.skipped = 0
+    
+    def __iter__(self):
+        """Yield (winner_path, loser_path) for every row of the log"""
+        if self.is_jsonl:
+            return self._iter_jsonl()
+        return self._iter_csv()
+    
+    def _iter_jsonl(self):
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    row = json.loads(line)
+                    yield row["winner"], row["loser"]
+    
+    def _iter_csv(self):
+        with open(self.log_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            
+            columns = [column.strip().lower() for column in header]
+            if "winner" in columns and "loser" in columns:
+                winner_col = columns.index("winner")
+                loser_col = columns.index("loser")
+            else:
+                # No header: the first row is already a result
+                winner_col, loser_col = 0, 1
+                if len(header) >= 2:
+                    yield header[0], header[1]
+            
+            needed = max(winner_col, loser_col)
+            for row in reader:
+                if len(row) > needed:
+                    yield row[winner_col], row[loser_col]
+    
+    def photos(self):
+        """First pass: return every photo named in the log, in order of first appearance"""
+        seen = {}
+        for winner, loser in self:
+            seen.setdefault(winner, None)
+            seen.setdefault(loser, None)
+        return list(seen)
+    
+    def id_batches(self, photo_to_index, batch_size=65536, resolve=None):
+        """Second pass: yield (winners, losers) arrays of photo ids, batch_size rows at a time
+        
+        Rows naming a photo missing from photo_to_index, or a photo against
+        itself, are counted in self.skipped. resolve optionally maps a
+        path from the log to the key used in photo_to_index.
+        """
+        self.rows = 0
+        self.skipped = 0
+        
+        winners = []
+        losers = []
+        for winner, loser in self:
+            self.rows += 1
+            if resolve is not None:
+                winner, loser = resolve(winner), resolve(loser)
+            winner_idx = photo_to_index.get(winner)
+            loser_idx = photo_to_index.get(loser)
+            if winner_idx is None or loser_idx is None or winner_idx == loser_idx:
+                self.skipped += 1
+                continue
+            
+            winners.append(winner_idx)
+            losers.append(loser_idx)
+            if len(winners) >= batch_size:
+                yield np.array(winners, dtype=np.int64), np.array(losers, dtype=np.int64)
+                winners = []
+                losers = []
+        
+        if winners:
+            yield np.array(winners, dtype=np.int64), np.array(losers, dtype=np.int64)
@@ -6,7 +6,12 @@ CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".photo_matchup_config.json"
 def load_config():
     """Load configuration from file"""
     config = {
-        "last_folder": None
+        "last_folder": None,
+        # Expected Kendall tau to the true order at which Bradley-Terry,
+        # Glicko-2 and TrueSkill sessions end
+        "stop_confidence": 0.8,
+        # Memory budget (MB) for decoded photos kept in memory for reuse
+        "image_cache_mb": 64
     }
     
     if os.path.exists(CONFIG_FILE):
@@ -0,0 +1,168 @@
+import os
+import struct
+import time
+
+# Journal file kept in the photo folder while a session is in progress
+JOURNAL_NAME = ".photo_matchup_journal"
+
+# Engine snapshot taken every so often, so resuming only replays the journal tail
+SNAPSHOT_NAME = ".photo_matchup_snapshot"
+
+MAGIC = b"PMJ1"
+VERSION = 1
+
+# magic, version, reserved, random seed, top_k, system name length, photo list length
+HEADER = struct.Struct("<4sHHQIHI")
+
+# One comparison: winner id, loser id (ids index the photo list in the header)
+RECORD = struct.Struct("<II")
+
+def journal_path(folder_path):
+    """Return the journal location for a photo folder"""
+    return os.path.join(folder_path, JOURNAL_NAME)
+
+def snapshot_path(folder_path):
+    """Return the snapshot location for a photo folder"""
+    return os.path.join(folder_path, SNAPSHOT_NAME)
+
+def read_journal(path):
+    """Read a journal and return its contents as a dict, or None if it is missing or invalid
+    
+    The dict has system_name, seed, top_k, photo_names (relative to the
+    folder), header_size and a records array of shape (count, 2) holding
+    (winner_id, loser_id). A partially written last record is ignored.
+    """
+    try:
+        with open(path, "rb") as f:
+            fixed = f.read(HEADER.size)
+            if len(fixed) < HEADER.size:
+                return None
+            magic, version, _, seed, top_k, name_len, photos_len = HEADER.unpack(fixed)
+            if magic != MAGIC or version != VERSION:
+                return None
+            
+            system_name = f.read(name_len).decode("utf-8")
+            photos_blob = f.read(photos_len).decode("utf-8")
+            size = os.fstat(f.fileno()).st_size
+    except (OSError, UnicodeDecodeError):
+        return None
+    
+    header_size = HEADER.size + name_len + photos_len
+    if size < header_size:
+        return None
+    photo_names = photos_blob.split("\n") if photos_blob else []
+    
+    # All records in one read, straight into an array. NumPy is imported
+    # here so the home screen (which imports this module) starts without it
+    import numpy as np
+    count = (size - header_size) // RECORD.size
+    records = np.fromfile(path, dtype="<u4", count=2 * count, offset=header_size).reshape(count, 2)
+    if count and records.max() >= len(photo_names):
+        return None
+    
+    return {
+        "system_name": system_name,
+        "seed": seed,
+        "top_k": top_k,
+        "photo_names": photo_names,
+        "header_size": header_size,
+        "records": records,
+    }
+
+class SessionJournal:
+    """Append-only binary journal of comparison results for crash-safe sessions
+    
+    Every result is written to the OS right away, so closing or crashing
+    the app loses nothing. fsync (the expensive part on SD cards) is only
+    done once per group of results or after a few seconds, whichever comes
+    first, so a power cut loses at most that last group.
+    """
+    
+    def __init__(self, path, file, seed, record_count=0, commit_every=16, commit_interval=2.0):
+        self.path = path
+        self.file = file
+        self.record_count = record_count
+        
+        # Seed of the session, also used to match snapshots to this journal
+        self.seed = seed
+        
+        # Group commit settings
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+    
+    @classmethod
+    def create(cls, path, system_name, seed, photo_names, top_k=20, **kwargs):
+        """Start a new journal, replacing any previous one"""
+        name_bytes = system_name.encode("utf-8")
+        photos_bytes = "\n".join(photo_names).encode("utf-8")
+        header = HEADER.pack(MAGIC, VERSION, 0, seed, top_k, len(name_bytes), len(photos_bytes))
+        
+        # Write the header to a temporary file and rename it into place, so a
+        # journal is never seen with a torn header
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header + name_bytes + photos_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        
+        return cls(path, open(path, "ab"), seed, 0, **kwargs)
+    
+    @classmethod
+    def resume(cls, path, contents, **kwargs):
+        """Continue appending to a journal read with read_journal"""
+        # Drop a partially written last record before appending
+        record_count = len(contents["records"])
+        f = open(path, "r+b")
+        f.truncate(contents["header_size"] + record_count * RECORD.size)
+        f.seek(0, os.SEEK_END)
+        return cls(path, f, contents["seed"], record_count, **kwargs)
+    
+    def append(self, winner_id, loser_id):
+        """Record one comparison result"""
+        self.file.write(RECORD.pack(winner_id, loser_id))
+        self.file.flush()
+        self.record_count += 1
+        self.uncommitted += 1
+        
+        if (self.uncommitted >= self.commit_every
+                or time.monotonic() - self.last_commit >= self.commit_interval):
+            self.commit()
+    
+    def commit(self):
+        """Force results written so far onto the storage device"""
+        if self.uncommitted:
+            os.fsync(self.file.fileno())
+            self.uncommitted = 0
+        self.last_commit = time.monotonic()
+    
+    def save_snapshot(self, rating_system):
+        """Snapshot the engine state covering every record written so far"""
+        # The journal must hold every record the snapshot covers
+        self.commit()
+        rating_system.snapshot(
+            snapshot_path(os.path.dirname(self.path)),
+            metadata={"seed": self.seed, "journal_records": self.record_count},
+        )
+    
+    @property
+    def closed(self):
+        return self.file.closed
+    
+    def close(self):
+        """Commit and close the journal"""
+        if self.file.closed:
+            return
+        self.commit()
+        self.file.close()
+    
+    def discard(self):
+        """Close and delete the journal and its snapshot (the session finished normally)"""
+        self.close()
+        for path in (self.path, snapshot_path(os.path.dirname(self.path))):
+            try:
+                os.remove(path)
+            except OSError:
+                pass